@@ -1,103 +1,308 @@
-import glob
-import os
-from utils import xywh2xyxy, box_iou
+from concurrent.futures import ProcessPoolExecutor
+from utils import best_gt_matches, match_at_iou_thresholds
+from label_cache import load_label_folder, gather_images
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 
-
-
-def evaluate_predictions(pred_folder, gt_folder, conf_th=0.1, cat=None):
-    nb_fp, nb_tp, nb_fn = 0, 0, 0
-
-    gt_filenames = [
-        os.path.splitext(os.path.basename(f))[0]
-        for f in glob.glob(os.path.join(gt_folder, "*.txt"))
-    ]
-    pred_filenames = [
-        os.path.splitext(os.path.basename(f))[0]
-        for f in glob.glob(os.path.join(pred_folder, "*.txt"))
-    ]
-
-    all_filenames = set(gt_filenames + pred_filenames)
+# IoU thresholds of detection_metrics: 0.1 (the cut-off of evaluate_predictions), then 0.5:0.95
+IOU_THRESHOLDS = np.concatenate([[0.1], np.linspace(0.5, 0.95, 10)])
+# COCO 101-point interpolation of the precision-recall curves
+RECALL_POINTS = np.linspace(0, 1, 101)
+
+
+def claimed_before(conf, best_gt, valid):
+    """
+    For every valid prediction, the highest confidence among the earlier
+    predictions matched to the same GT box (-inf if none); inf for the others.
+    """
+    claim = np.full(len(conf), np.inf)
+    valid_idx = np.flatnonzero(valid)
+    if len(valid_idx) == 0:
+        return claim
+    # Group by GT box, keeping file order inside each group
+    order = valid_idx[np.argsort(best_gt[valid_idx], kind="stable")]
+    new_group = np.r_[True, best_gt[order][1:] != best_gt[order][:-1]]
+    group = np.cumsum(new_group) - 1
+
+    # Running max per group on integer ranks: offsetting each group by the
+    # number of ranks keeps one accumulate from crossing group boundaries
+    values, ranks = np.unique(conf[order], return_inverse=True)
+    running = np.maximum.accumulate(group * len(values) + ranks) - group * len(values)
+
+    claim[order] = -np.inf
+    claim[order[~new_group]] = values[running[:-1][~new_group[1:]]]
+    return claim
+
+
+def match_labels(pred_labels, gt_labels, cat=None):
+    """
+    Reduce the greedy matching of loaded predictions against loaded labels
+    (see label_cache.load_label_folder) to one number per prediction, so
+    every confidence threshold can be scored from the same arrays.
+
+    A prediction is matched greedily, in file order, to its best-IoU GT box.
+    That box does not depend on the threshold, so a prediction is a TP exactly
+    when it passes the threshold and no earlier prediction of the same image
+    claiming the same GT box does: for thresholds in (claim, conf], where claim
+    is the highest confidence among those earlier predictions (-inf if none,
+    inf if the prediction never matches).
+    """
+    all_filenames = set(gt_labels["names"].tolist()) | set(pred_labels["names"].tolist())
     if cat is not None:
         all_filenames = [f for f in all_filenames if cat == f.split("_")[0].lower()]
+    all_filenames = sorted(all_filenames)
+
+    # Boxes of all images concatenated, with the offset of each image
+    gt_boxes, _, _, gt_offsets = gather_images(gt_labels, all_filenames)
+    pred_boxes, conf, _, pred_offsets = gather_images(pred_labels, all_filenames)
+
+    best_gt, max_iou = best_gt_matches(pred_boxes, pred_offsets, gt_boxes, gt_offsets)
+    valid = (best_gt >= 0) & (max_iou > 0.1)
+
+    return {"conf": conf, "claim": claimed_before(conf, best_gt, valid), "nb_gt": len(gt_boxes)}
+
+
+def load_matches(pred_folder, gt_folder, cat=None, use_cache=True):
+    """
+    Load the labels and predictions of a folder once (from the label cache
+    when it is up to date) and match them with match_labels.
+    """
+    gt_labels = load_label_folder(gt_folder, use_cache=use_cache)
+    pred_labels = load_label_folder(pred_folder, predictions=True, use_cache=use_cache)
+    return match_labels(pred_labels, gt_labels, cat)
+
+
+def sweep_conf_thresholds(matches, conf_thres_range):
+    """
+    Precision, recall and F1 score arrays, one value per threshold.
+    """
+    conf_thres_range = np.asarray(conf_thres_range, dtype=float)
+    conf = np.sort(matches["conf"])
+    # A prediction that passes t is an FP there when t <= min(conf, claim)
+    unmatched = np.sort(np.minimum(matches["conf"], matches["claim"]))
+
+    nb_pred = len(conf) - np.searchsorted(conf, conf_thres_range, side="left")
+    nb_tp = nb_pred - (len(unmatched) - np.searchsorted(unmatched, conf_thres_range, side="left"))
+    nb_fp = nb_pred - nb_tp
+    nb_fn = matches["nb_gt"] - nb_tp
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(nb_tp + nb_fp > 0, nb_tp / (nb_tp + nb_fp), 0.0)
+        recall = np.where(nb_tp + nb_fn > 0, nb_tp / (nb_tp + nb_fn), 0.0)
+        f1_score = np.where(
+            precision + recall > 0,
+            2 * (precision * recall) / (precision + recall),
+            0.0,
+        )
 
-    for filename in all_filenames:
-        gt_file = os.path.join(gt_folder, f"{filename}.txt")
-        pred_file = os.path.join(pred_folder, f"{filename}.txt")
-
-        gt_boxes = []
-        if os.path.isfile(gt_file) and os.path.getsize(gt_file) > 0:
-            with open(gt_file, "r") as f:
-                gt_boxes = [
-                    xywh2xyxy(np.array(line.strip().split(" ")[1:5]).astype(float))
-                    for line in f.readlines()
-                ]
-
-        gt_matches = np.zeros(len(gt_boxes), dtype=bool)
-
-        if os.path.isfile(pred_file) and os.path.getsize(pred_file) > 0:
-            with open(pred_file, "r") as f:
-                pred_boxes = [line.strip().split(" ") for line in f.readlines()]
-
-            for pred_box in pred_boxes:
-                try:
-                    _, x, y, w, h, conf = map(float, pred_box)
-                except:
-                    print(f"Error reading {pred_file}")
-                    continue
-                if conf < conf_th:
-                    continue
-                pred_box = xywh2xyxy(np.array([x, y, w, h]))
-
-                if gt_boxes:
-                    # Encontrar la mejor coincidencia por IoU
-                    iou_values = [box_iou(pred_box, gt_box) for gt_box in gt_boxes]
-                    max_iou = max(iou_values)
-                    best_match_idx = np.argmax(iou_values)
-
-                    # Verificar coincidencia válida y única
-                    if max_iou > 0.1 and not gt_matches[best_match_idx]:
-                        nb_tp += 1
-                        gt_matches[best_match_idx] = True
-                    else:
-                        nb_fp += 1
-                else:
-                    nb_fp += 1
-
-        if gt_boxes:
-            nb_fn += len(gt_boxes) - np.sum(gt_matches)
-
-    precision = nb_tp / (nb_tp + nb_fp) if (nb_tp + nb_fp) > 0 else 0
-    recall = nb_tp / (nb_tp + nb_fn) if (nb_tp + nb_fn) > 0 else 0
-    f1_score = (
-        2 * (precision * recall) / (precision + recall)
-        if (precision + recall) > 0
-        else 0
+    return {"precision": precision, "recall": recall, "f1_score": f1_score}
+
+
+def evaluate_predictions(pred_folder, gt_folder, conf_th=0.1, cat=None):
+    results = sweep_conf_thresholds(load_matches(pred_folder, gt_folder, cat), [conf_th])
+    return {metric: float(values[0]) for metric, values in results.items()}
+
+
+def pr_envelope(recall, precision):
+    """
+    Precision envelope of a precision-recall curve, sampled at RECALL_POINTS.
+    """
+    recall = np.concatenate([[0.0], recall, [1.0]])
+    precision = np.concatenate([[1.0], precision, [0.0]])
+    precision = np.flip(np.maximum.accumulate(np.flip(precision)))
+    return np.interp(RECALL_POINTS, recall, precision)
+
+
+def pr_curves(tp, nb_gt):
+    """
+    PR curves of one class at every IoU threshold, as a (T, 101) array, from
+    the (P, T) true-positive flags of its predictions sorted by confidence.
+    """
+    if len(tp) == 0:
+        return np.zeros((tp.shape[1], len(RECALL_POINTS)))
+    nb_tp = np.cumsum(tp, axis=0)
+    nb_fp = np.cumsum(~tp, axis=0)
+    recall = nb_tp / nb_gt
+    precision = nb_tp / (nb_tp + nb_fp)
+    return np.stack([pr_envelope(recall[:, t], precision[:, t]) for t in range(tp.shape[1])])
+
+
+def subset_metrics(tp, pred_cls, gt_cls):
+    """
+    AP of each class and their mean over the classes of the GT boxes.
+    """
+    classes = np.unique(gt_cls)
+    if len(classes) == 0:
+        ap = np.full(tp.shape[1], np.nan)
+        curves = np.full((tp.shape[1], len(RECALL_POINTS)), np.nan)
+    else:
+        class_curves = np.stack([pr_curves(tp[pred_cls == c], np.count_nonzero(gt_cls == c)) for c in classes])
+        # Trapezoidal area under each interpolated curve
+        class_ap = ((class_curves[..., 1:] + class_curves[..., :-1]) / 2 * np.diff(RECALL_POINTS)).sum(axis=2)
+        ap = class_ap.mean(axis=0)
+        curves = class_curves.mean(axis=0)
+
+    return {
+        "nb_gt": len(gt_cls),
+        "nb_pred": len(tp),
+        "ap": ap,
+        "ap10": ap[0],
+        "ap50": ap[1],
+        "ap50_95": ap[1:].mean(),
+        "pr_curves": curves,
+    }
+
+
+def detection_metrics(pred_labels, gt_labels):
+    """
+    mAP and PR curves at every IoU threshold, overall and for each category
+    (the filename prefix used by the cat filter), from loaded labels.
+
+    Matching follows YOLO validation: one-to-one, class-aware, with the most
+    confident prediction winning a contested GT box. Predictions are sorted by
+    confidence once; the per-class and per-category curves are subsets of
+    that order. AP is reported at every IOU_THRESHOLDS value (ap) and as
+    AP@0.1 (ap10), AP@0.5 (ap50) and AP@0.5:0.95 (ap50_95).
+    """
+    names = sorted(set(gt_labels["names"].tolist()) | set(pred_labels["names"].tolist()))
+    gt_boxes, _, gt_cls, gt_offsets = gather_images(gt_labels, names)
+    pred_boxes, conf, pred_cls, pred_offsets = gather_images(pred_labels, names)
+    gt_image = np.repeat(np.arange(len(names)), np.diff(gt_offsets))
+    pred_image = np.repeat(np.arange(len(names)), np.diff(pred_offsets))
+
+    # Most confident first inside each image
+    order = np.lexsort((-conf, pred_image))
+    pred_boxes, conf, pred_cls = pred_boxes[order], conf[order], pred_cls[order]
+    tp = match_at_iou_thresholds(
+        pred_boxes, pred_cls, pred_offsets, gt_boxes, gt_cls, gt_offsets, IOU_THRESHOLDS
     )
 
-    return {"precision": precision, "recall": recall, "f1_score": f1_score}
+    by_conf = np.argsort(-conf, kind="stable")
+    tp, pred_cls, pred_image = tp[by_conf], pred_cls[by_conf], pred_image[by_conf]
 
+    categories = np.array([name.split("_")[0].lower() for name in names])
+    metrics = {"iou_thresholds": IOU_THRESHOLDS, "all": subset_metrics(tp, pred_cls, gt_cls), "categories": {}}
+    for cat in np.unique(categories).tolist():
+        in_pred = categories[pred_image] == cat
+        in_gt = categories[gt_image] == cat
+        metrics["categories"][cat] = subset_metrics(tp[in_pred], pred_cls[in_pred], gt_cls[in_gt])
+    return metrics
 
-def find_best_conf_threshold(pred_folder, gt_folder, conf_thres_range, cat=None):
+
+def evaluate_detection_metrics(pred_folder, gt_folder):
+    gt_labels = load_label_folder(gt_folder)
+    pred_labels = load_label_folder(pred_folder, predictions=True)
+    return detection_metrics(pred_labels, gt_labels)
+
+
+def detection_metrics_table(metrics):
+    rows = [("all", metrics["all"])] + list(metrics["categories"].items())
+    return pd.DataFrame(
+        [
+            [cat, m["nb_gt"], m["nb_pred"], m["ap10"], m["ap50"], m["ap50_95"]]
+            for cat, m in rows
+        ],
+        columns=["Category", "GT Boxes", "Predictions", "AP@0.1", "AP@0.5", "AP@0.5:0.95"],
+    )
+
+
+def plot_pr_curves(metrics, path):
+    all_metrics = metrics["all"]
+    plt.figure(figsize=(10, 6))
+    plt.plot(RECALL_POINTS, all_metrics["pr_curves"][0], label=f"IoU 0.1 (AP {all_metrics['ap10']:.3f})")
+    plt.plot(RECALL_POINTS, all_metrics["pr_curves"][1], label=f"IoU 0.5 (AP {all_metrics['ap50']:.3f})")
+    plt.plot(
+        RECALL_POINTS,
+        all_metrics["pr_curves"][1:].mean(axis=0),
+        label=f"IoU 0.5:0.95 (AP {all_metrics['ap50_95']:.3f})",
+    )
+    plt.title("Precision-Recall Curves")
+    plt.xlabel("Recall")
+    plt.ylabel("Precision")
+    plt.xlim(0, 1)
+    plt.ylim(0, 1.05)
+    plt.legend()
+    plt.grid(True)
+    plt.savefig(path)
+    plt.close()
+
+
+def best_conf_threshold(results, conf_thres_range):
+    """
+    First threshold with the highest F1 score of a sweep, as
+    (threshold, f1 score, precision, recall); all zeros if no F1 is positive.
+    """
     best_conf_thres = 0
     best_f1_score = 0
     best_precision = 0
     best_recall = 0
 
-    for conf_thres in conf_thres_range:
-        results = evaluate_predictions(pred_folder, gt_folder, conf_thres, cat)
-        if results["f1_score"] > best_f1_score:
+    for i, conf_thres in enumerate(conf_thres_range):
+        if results["f1_score"][i] > best_f1_score:
             best_conf_thres = conf_thres
-            best_f1_score = results["f1_score"]
-            best_precision = results["precision"]
-            best_recall = results["recall"]
+            best_f1_score = results["f1_score"][i]
+            best_precision = results["precision"][i]
+            best_recall = results["recall"][i]
 
     return best_conf_thres, best_f1_score, best_precision, best_recall
 
 
-def evaluate_multiple_pred_folders(pred_folders, gt_folder, conf_thres_range, cat=None):
+def find_best_conf_threshold(pred_folder, gt_folder, conf_thres_range, cat=None):
+    results = sweep_conf_thresholds(load_matches(pred_folder, gt_folder, cat), conf_thres_range)
+    return best_conf_threshold(results, conf_thres_range)
+
+
+def sweep_pred_folder(pred_folder, gt_labels, conf_thres_range, cat=None, detection=False):
+    pred_labels = load_label_folder(pred_folder, predictions=True)
+    results = sweep_conf_thresholds(match_labels(pred_labels, gt_labels, cat), conf_thres_range)
+    if detection:
+        results["detection"] = detection_metrics(pred_labels, gt_labels)
+    return results
+
+
+# Ground truth of the sweep_pred_folders worker processes, sent once per process
+worker_gt_labels = None
+
+
+def init_sweep_worker(gt_labels):
+    global worker_gt_labels
+    worker_gt_labels = gt_labels
+
+
+def sweep_worker(pred_folder, conf_thres_range, cat, detection):
+    return sweep_pred_folder(pred_folder, worker_gt_labels, conf_thres_range, cat, detection)
+
+
+def sweep_pred_folders(pred_folders, gt_folder, conf_thres_range, cat=None, max_workers=None, detection=False):
+    """
+    Sweep the confidence thresholds of several prediction folders (one per
+    model) in a process pool. The ground truth is parsed once and handed to
+    each worker when it starts. conf_thres_range is shared by all folders or
+    a {pred_folder: thresholds} dict. Returns {pred_folder: sweep results};
+    with detection=True each result also holds its detection_metrics.
+    """
+    gt_labels = load_label_folder(gt_folder)
+    if not isinstance(conf_thres_range, dict):
+        conf_thres_range = dict.fromkeys(pred_folders, conf_thres_range)
+
+    if max_workers == 1 or len(pred_folders) <= 1:
+        return {
+            pred_folder: sweep_pred_folder(pred_folder, gt_labels, conf_thres_range[pred_folder], cat, detection)
+            for pred_folder in pred_folders
+        }
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=init_sweep_worker, initargs=(gt_labels,)
+    ) as executor:
+        futures = {
+            pred_folder: executor.submit(sweep_worker, pred_folder, conf_thres_range[pred_folder], cat, detection)
+            for pred_folder in pred_folders
+        }
+        return {pred_folder: future.result() for pred_folder, future in futures.items()}
+
+
+def evaluate_multiple_pred_folders(pred_folders, gt_folder, conf_thres_range, cat=None, sweeps=None, max_workers=None):
     # Initialize a DataFrame to store the results
     results_df = pd.DataFrame(
         columns=[
@@ -109,9 +314,13 @@ def evaluate_multiple_pred_folders(pred_folders, gt_folder, conf_thres_range, ca
         ]
     )
 
+    # Reuse the sweeps of an earlier sweep_pred_folders call if given
+    if sweeps is None:
+        sweeps = sweep_pred_folders(pred_folders, gt_folder, conf_thres_range, cat, max_workers)
+
     for pred_folder in pred_folders:
         best_conf_thres, best_f1_score, best_precision, best_recall = (
-            find_best_conf_threshold(pred_folder, gt_folder, conf_thres_range, cat)
+            best_conf_threshold(sweeps[pred_folder], conf_thres_range)
         )
 
         # Use loc to append data to the DataFrame to avoid potential issues
@@ -127,15 +336,14 @@ def evaluate_multiple_pred_folders(pred_folders, gt_folder, conf_thres_range, ca
 
 
 def find_best_conf_threshold_and_plot(
-    pred_folder, gt_folder, conf_thres_range, plot=True
+    pred_folder, gt_folder, conf_thres_range, plot=True, results=None
 ):
-    f1_scores, precisions, recalls = [], [], []
-
-    for conf_thres in conf_thres_range:
-        results = evaluate_predictions(pred_folder, gt_folder, conf_thres)
-        f1_scores.append(results["f1_score"])
-        precisions.append(results["precision"])
-        recalls.append(results["recall"])
+    # results: this folder's sweep, if already computed by sweep_pred_folders
+    if results is None:
+        results = sweep_conf_thresholds(load_matches(pred_folder, gt_folder), conf_thres_range)
+    f1_scores = results["f1_score"]
+    precisions = results["precision"]
+    recalls = results["recall"]
 
     # Find the best confidence threshold
     best_idx = np.argmax(f1_scores)
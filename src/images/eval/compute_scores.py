@@ -4,9 +4,11 @@ import pandas as pd
 import glob
 import argparse
 from compute_perf import (
-    evaluate_predictions,
     evaluate_multiple_pred_folders,
     find_best_conf_threshold_and_plot,
+    sweep_pred_folders,
+    detection_metrics_table,
+    plot_pr_curves,
 )
 
 def main(args):
@@ -22,8 +24,13 @@ def main(args):
     
     
     
+    # Evaluar todos los modelos en paralelo, una sola vez para la tabla y los gráficos
+    sweeps = sweep_pred_folders(
+        pred_folder, gt_folder, conf_thres_range, max_workers=args.workers, detection=args.map
+    )
+
     # Obtener resultados de la evaluación de predicciones
-    results_df = evaluate_multiple_pred_folders(pred_folder, gt_folder, conf_thres_range)
+    results_df = evaluate_multiple_pred_folders(pred_folder, gt_folder, conf_thres_range, sweeps=sweeps)
     results_df = results_df.sort_values(by="Best F1 Score", ascending=False)
 
     print(results_df)
@@ -31,18 +38,25 @@ def main(args):
     # Obtener los mejores valores utilizando la función proporcionada
     for pred_foldera in pred_folder:
         best_conf_thres, best_f1_score, best_precision, best_recall = (
-            find_best_conf_threshold_and_plot(pred_foldera, gt_folder, conf_thres_range, True)
+            find_best_conf_threshold_and_plot(pred_foldera, gt_folder, conf_thres_range, True, sweeps[pred_foldera])
         )
 
         print(
             f"Best Confidence Threshold: {best_conf_thres}\nBest F1 Score: {best_f1_score}\nPrecision: {best_precision}\nRecall: {best_recall}"
         )
+
+        # mAP a varios umbrales de IoU, por categoría, y curvas precisión-recall
+        if args.map:
+            print(detection_metrics_table(sweeps[pred_foldera]["detection"]))
+            plot_pr_curves(sweeps[pred_foldera]["detection"], f"{pred_foldera}/pr_curves.png")
    
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Evaluate prediction folders and find the best confidence threshold.")
     parser.add_argument("--gt_folder", type=str, required=True, help="Path to the ground truth labels folder.")
     parser.add_argument("--pred_folder", type=str, required=True, help="Path to the prediction labels folder.")
+    parser.add_argument("--map", action="store_true", help="Also report AP@0.1, AP@0.5 and AP@0.5:0.95 per category and save PR curves.")
+    parser.add_argument("--workers", type=int, default=None, help="Processes evaluating prediction folders in parallel (default: one per CPU).")
     
     args = parser.parse_args()
     
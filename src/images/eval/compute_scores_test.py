@@ -4,8 +4,7 @@ import pandas as pd
 import glob
 import argparse
 from compute_perf import (
-    evaluate_predictions,
-    evaluate_multiple_pred_folders,
+    sweep_pred_folders,
 )
 
 def load_conf_values(conf_file):
@@ -26,7 +25,7 @@ def main(args):
     prediction_files = glob.glob(os.path.join(pred_folder, "*"))
     pred_folder = [os.path.join(dir, 'labels') for dir in prediction_files]
     
-    results = []
+    conf_thresholds = {}
     for pred_foldera in pred_folder:
         # Extraer el nombre del modelo desde la ruta
         # model_name = os.path.basename(os.path.dirname(os.path.dirname(pred_foldera)))
@@ -42,15 +41,23 @@ def main(args):
             print(f"Model: {model_name} not found in the confidence dictionary. Skipping evaluation.")
             conf_thres = 0.05
         print(f"Model: {model_name}, Confidence Threshold: {conf_thres}")
+        conf_thresholds[pred_foldera] = [conf_thres]
+
+    # Evaluar todos los modelos en paralelo, leyendo el ground truth una sola vez
+    sweeps = sweep_pred_folders(
+        list(conf_thresholds), gt_folder, conf_thresholds, max_workers=args.workers
+    )
 
-        metrics = evaluate_predictions(pred_foldera, gt_folder, conf_th=conf_thres)
+    results = []
+    for pred_foldera, (conf_thres,) in conf_thresholds.items():
+        metrics = sweeps[pred_foldera]
         results.append({
             "Prediction Folder": "test",
-            "Model Name": model_name,
+            "Model Name": pred_foldera.split('/')[-2],
             "Confidence Threshold": conf_thres,
-            "Precision": metrics["precision"],
-            "Recall": metrics["recall"],
-            "F1 Score": metrics["f1_score"]
+            "Precision": float(metrics["precision"][0]),
+            "Recall": float(metrics["recall"][0]),
+            "F1 Score": float(metrics["f1_score"][0])
         })
 
     # Convertir los resultados a un DataFrame para su fácil visualización
@@ -66,5 +73,6 @@ if __name__ == "__main__":
     parser.add_argument("--gt_folder", type=str, required=True, help="Path to the ground truth labels folder.")
     parser.add_argument("--pred_folder", type=str, required=True, help="Path to the prediction labels folder.")
     parser.add_argument("--conf_file", type=str, required=True, help="Path to the CSV file containing confidence thresholds.")
+    parser.add_argument("--workers", type=int, default=None, help="Processes evaluating prediction folders in parallel (default: one per CPU).")
     args = parser.parse_args()
     main(args)
\ No newline at end of file
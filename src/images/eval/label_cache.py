@@ -0,0 +1,168 @@
+import os
+import zipfile
+import numpy as np
+from utils import xywh2xyxy
+
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".cache.npz"
+
+
+def cache_path(folder):
+    """Cache file of a label folder, next to it: labels/val -> labels/val.cache.npz"""
+    return f"{os.path.normpath(folder)}{CACHE_SUFFIX}"
+
+
+def parse_label_file(path, predictions=False):
+    """
+    Parse a YOLO-format label file into (cls, x1, y1, x2, y2, conf) rows.
+
+    Prediction lines must be "cls x y w h conf"; lines that do not parse are
+    reported and skipped. Ground truth lines are "cls x y w h" and get a NaN
+    confidence.
+    """
+    if os.path.getsize(path) == 0:
+        return []
+    with open(path, "r") as f:
+        lines = [line.strip().split(" ") for line in f.readlines()]
+
+    rows = []
+    for parts in lines:
+        if predictions:
+            try:
+                cls, x, y, w, h, conf = map(float, parts)
+            except:
+                print(f"Error reading {path}")
+                continue
+            box = xywh2xyxy(np.array([x, y, w, h]))
+        else:
+            box = xywh2xyxy(np.array(parts[1:5]).astype(float))
+            try:
+                cls = float(parts[0])
+            except ValueError:
+                cls = -1
+            conf = np.nan
+        rows.append((cls, *box, conf))
+    return rows
+
+
+def scan_label_folder(folder):
+    """Return {name: mtime_ns} for the folder's .txt files, without the extension."""
+    if not os.path.isdir(folder):
+        return {}
+    with os.scandir(folder) as entries:
+        return {
+            entry.name[:-4]: entry.stat().st_mtime_ns
+            for entry in entries
+            if entry.name.endswith(".txt") and not entry.name.startswith(".") and entry.is_file()
+        }
+
+
+def read_cache(folder, predictions):
+    path = cache_path(folder)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with np.load(path) as data:
+            cache = {key: data[key] for key in data.files}
+        valid = (
+            int(cache["version"]) == CACHE_VERSION
+            and str(cache["folder"]) == os.path.abspath(folder)
+            and bool(cache["predictions"]) == predictions
+        )
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+        print(f"Ignoring unreadable label cache {path}: {e}")
+        return None
+    return cache if valid else None
+
+
+def write_cache(folder, predictions, labels, mtimes):
+    path = cache_path(folder)
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                version=CACHE_VERSION,
+                folder=os.path.abspath(folder),
+                predictions=predictions,
+                mtimes=mtimes,
+                **labels,
+            )
+        os.replace(tmp_path, path)
+    except OSError as e:
+        # Read-only datasets are still evaluated, just without a cache
+        print(f"Could not write label cache {path}: {e}")
+
+
+def load_label_folder(folder, predictions=False, use_cache=True):
+    """
+    Load every label file of a folder as concatenated arrays:
+
+    - names: file names without extension, sorted
+    - offsets: rows of image i are offsets[i]:offsets[i + 1]
+    - boxes: (K, 4) boxes in (x1, y1, x2, y2) format
+    - conf: (K,) confidences, NaN for ground truth
+    - cls: (K,) class ids
+
+    The arrays are kept in a cache file next to the folder, keyed by the
+    folder path and the mtime of every label file. Only new or modified files
+    are parsed again, so repeat runs stat the files instead of reading them.
+    """
+    mtimes = scan_label_folder(folder)
+    names = sorted(mtimes)
+
+    cache = read_cache(folder, predictions) if use_cache else None
+    if (
+        cache is not None
+        and cache["names"].tolist() == names
+        and cache["mtimes"].tolist() == [mtimes[name] for name in names]
+    ):
+        return {key: cache[key] for key in ("names", "offsets", "boxes", "conf", "cls")}
+
+    cached = {}
+    if cache is not None:
+        for i, (name, mtime) in enumerate(zip(cache["names"], cache["mtimes"])):
+            cached[str(name)] = (int(mtime), i)
+
+    offsets = [0]
+    pieces = []
+    for name in names:
+        entry = cached.get(name)
+        if entry is not None and entry[0] == mtimes[name]:
+            start, end = cache["offsets"][entry[1]], cache["offsets"][entry[1] + 1]
+            rows = np.column_stack(
+                [cache["cls"][start:end], cache["boxes"][start:end], cache["conf"][start:end]]
+            )
+        else:
+            rows = np.array(parse_label_file(os.path.join(folder, f"{name}.txt"), predictions), dtype=float).reshape(-1, 6)
+        pieces.append(rows)
+        offsets.append(offsets[-1] + len(rows))
+
+    rows = np.concatenate(pieces) if pieces else np.zeros((0, 6))
+    labels = {
+        "names": np.array(names, dtype=str),
+        "offsets": np.array(offsets, dtype=np.int64),
+        "boxes": rows[:, 1:5],
+        "conf": rows[:, 5],
+        "cls": rows[:, 0].astype(np.int64),
+    }
+
+    if use_cache:
+        write_cache(folder, predictions, labels, np.array([mtimes[name] for name in names], dtype=np.int64))
+    return labels
+
+
+def gather_images(labels, names):
+    """
+    Rows of the given images, in that order, as (boxes, conf, cls, offsets).
+    Images missing from the folder have no rows.
+    """
+    offsets = labels["offsets"]
+    index = {name: i for i, name in enumerate(labels["names"].tolist())}
+    rows = np.array([index.get(name, -1) for name in names], dtype=np.int64)
+
+    # Index -1 (missing image) picks the trailing zero count
+    counts = np.append(np.diff(offsets), 0)[rows]
+    new_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    take = np.repeat(offsets[rows] - new_offsets[:-1], counts) + np.arange(new_offsets[-1])
+    return labels["boxes"][take], labels["conf"][take], labels["cls"][take], new_offsets
@@ -40,4 +40,122 @@ def box_iou(box1: np.ndarray, box2: np.ndarray, eps: float = 1e-7):
     )
 
     # IoU = inter / (area1 + area2 - inter)
-    return inter / ((a2 - a1).prod(1) + (b2 - b1).prod(1)[:, None] - inter + eps)
\ No newline at end of file
+    return inter / ((a2 - a1).prod(1) + (b2 - b1).prod(1)[:, None] - inter + eps)
+
+
+def pairwise_box_iou(box1: np.ndarray, box2: np.ndarray, eps: float = 1e-7):
+    """
+    Calculate the IoU of box1[i] and box2[i] for every row i.
+
+    Args:
+        box1 (np.ndarray): A numpy array of shape (K, 4) in (x1, y1, x2, y2) format.
+        box2 (np.ndarray): A numpy array of shape (K, 4) in (x1, y1, x2, y2) format.
+        eps (float, optional): A small value to avoid division by zero. Defaults to 1e-7.
+
+    Returns:
+        (np.ndarray): A numpy array of shape (K,) with the IoU of each pair, computed exactly like box_iou.
+    """
+    inter = (
+        (np.minimum(box1[:, 2:], box2[:, 2:]) - np.maximum(box1[:, :2], box2[:, :2]))
+        .clip(0)
+        .prod(1)
+    )
+    return inter / ((box1[:, 2:] - box1[:, :2]).prod(1) + (box2[:, 2:] - box2[:, :2]).prod(1) - inter + eps)
+
+
+def box_pairs(pred_offsets, gt_offsets):
+    """
+    Enumerate the (prediction, GT) index pairs of every image, grouped by prediction.
+
+    Args:
+        pred_offsets (np.ndarray): A numpy array of shape (I + 1,) with the first prediction of each image.
+        gt_offsets (np.ndarray): A numpy array of shape (I + 1,) with the first GT box of each image.
+
+    Returns:
+        (np.ndarray, np.ndarray, np.ndarray, np.ndarray): The prediction and GT index of each pair,
+        and the first pair and number of pairs of each prediction.
+    """
+    nb_pred = np.diff(pred_offsets)
+    nb_gt = np.diff(gt_offsets)
+    image = np.repeat(np.arange(len(nb_pred)), nb_pred)
+
+    pairs_per_pred = nb_gt[image]
+    pair_starts = np.cumsum(pairs_per_pred) - pairs_per_pred
+    pair_pred = np.repeat(np.arange(len(image)), pairs_per_pred)
+    pair_gt = gt_offsets[:-1][image][pair_pred] + np.arange(len(pair_pred)) - pair_starts[pair_pred]
+    return pair_pred, pair_gt, pair_starts, pairs_per_pred
+
+
+def best_gt_matches(pred_boxes, pred_offsets, gt_boxes, gt_offsets):
+    """
+    Find the best-IoU ground truth box of every prediction, for many images at once.
+
+    The boxes of image k are pred_boxes[pred_offsets[k]:pred_offsets[k + 1]] and
+    gt_boxes[gt_offsets[k]:gt_offsets[k + 1]]. The N x M IoU blocks of all images
+    are computed together as one flat array of (prediction, GT) pairs.
+
+    Args:
+        pred_boxes (np.ndarray): A numpy array of shape (P, 4) in (x1, y1, x2, y2) format.
+        pred_offsets (np.ndarray): A numpy array of shape (I + 1,) with the first prediction of each image.
+        gt_boxes (np.ndarray): A numpy array of shape (G, 4) in (x1, y1, x2, y2) format.
+        gt_offsets (np.ndarray): A numpy array of shape (I + 1,) with the first GT box of each image.
+
+    Returns:
+        (np.ndarray, np.ndarray): For each prediction, the index into gt_boxes of its best match
+        (the first one on ties, -1 if its image has no GT boxes) and the IoU with it.
+    """
+    pair_pred, pair_gt, pair_starts, pairs_per_pred = box_pairs(pred_offsets, gt_offsets)
+    iou = pairwise_box_iou(pred_boxes[pair_pred], gt_boxes[pair_gt])
+
+    best_gt = np.full(len(pred_boxes), -1)
+    max_iou = np.zeros(len(pred_boxes))
+    has_gt = pairs_per_pred > 0
+    if has_gt.any():
+        max_iou[has_gt] = np.maximum.reduceat(iou, pair_starts[has_gt])
+        # First pair of each prediction reaching its maximum, like np.argmax
+        at_max = np.flatnonzero(iou == max_iou[pair_pred])
+        preds, first = np.unique(pair_pred[at_max], return_index=True)
+        best_gt[preds] = pair_gt[at_max[first]]
+
+    return best_gt, max_iou
+
+
+def match_at_iou_thresholds(pred_boxes, pred_cls, pred_offsets, gt_boxes, gt_cls, gt_offsets, iou_thresholds):
+    """
+    Match predictions one-to-one to GT boxes of the same class at several IoU thresholds,
+    for many images at once, like YOLO validation.
+
+    At each threshold every prediction keeps its best-IoU GT box among those reaching the
+    threshold, and a GT box kept by several predictions goes to the first of them, so
+    predictions must be sorted by decreasing confidence inside each image.
+
+    Args:
+        pred_boxes (np.ndarray): A numpy array of shape (P, 4) in (x1, y1, x2, y2) format.
+        pred_cls (np.ndarray): A numpy array of shape (P,) with the class of each prediction.
+        pred_offsets (np.ndarray): A numpy array of shape (I + 1,) with the first prediction of each image.
+        gt_boxes (np.ndarray): A numpy array of shape (G, 4) in (x1, y1, x2, y2) format.
+        gt_cls (np.ndarray): A numpy array of shape (G,) with the class of each GT box.
+        gt_offsets (np.ndarray): A numpy array of shape (I + 1,) with the first GT box of each image.
+        iou_thresholds (np.ndarray): A numpy array of shape (T,) with the IoU thresholds.
+
+    Returns:
+        (np.ndarray): A (P, T) boolean numpy array, True where the prediction is a true positive.
+    """
+    pair_pred, pair_gt, _, _ = box_pairs(pred_offsets, gt_offsets)
+    same_class = pred_cls[pair_pred] == gt_cls[pair_gt]
+    pair_pred, pair_gt = pair_pred[same_class], pair_gt[same_class]
+    iou = pairwise_box_iou(pred_boxes[pair_pred], gt_boxes[pair_gt])
+
+    by_iou = np.argsort(-iou, kind="stable")
+    pair_pred, pair_gt, iou = pair_pred[by_iou], pair_gt[by_iou], iou[by_iou]
+
+    tp = np.zeros((len(pred_boxes), len(iou_thresholds)), dtype=bool)
+    for i, threshold in enumerate(iou_thresholds):
+        keep = np.flatnonzero(iou >= threshold)
+        # Best GT box of each prediction; np.unique leaves them in prediction order
+        _, first = np.unique(pair_pred[keep], return_index=True)
+        keep = keep[first]
+        # First prediction of each GT box
+        _, first = np.unique(pair_gt[keep], return_index=True)
+        tp[pair_pred[keep[first]], i] = True
+    return tp
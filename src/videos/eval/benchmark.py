@@ -0,0 +1,330 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+import cv2
+import numpy as np
+import torch
+from utils.file_processor import SequenceDetector, process_files_in_folder
+from utils.frame_source import ImageFolderSource
+from utils.scheduler import InferenceScheduler
+from utils.timing import StageTimer
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+class SampleTimer(StageTimer):
+    """
+    StageTimer that also keeps the raw durations, for exact percentiles.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.samples = {}
+
+    def add(self, name, seconds):
+        super().add(name, seconds)
+        self.samples.setdefault(name, []).append(seconds)
+
+def burn_cpu(seconds):
+    # Busy-wait rather than sleep so stand-in models compete for the CPU like real ones
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+class StandInBoxes:
+    def __init__(self, xyxy, conf):
+        self.xyxy = xyxy
+        self.conf = conf
+
+    def __len__(self):
+        return len(self.xyxy)
+
+class StandInResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+class StandInDetector:
+    """
+    Mimics the Ultralytics call interface with a fixed cost per call and per image.
+    Every frame returns the plume box plus `extra_boxes` deterministic distractors,
+    in full-resolution pixels scaled down to the input image like a real detector
+    run on a reduced decode.
+    """
+
+    def __init__(self, plume_box, full_width, cost_per_call=0.0, cost_per_image=0.0, extra_boxes=1):
+        self.plume_box = plume_box
+        self.full_width = full_width
+        self.cost_per_call = cost_per_call
+        self.cost_per_image = cost_per_image
+        self.extra_boxes = extra_boxes
+
+    def __call__(self, images, verbose=False, conf=0.25):
+        images = images if isinstance(images, list) else [images]
+        burn_cpu(self.cost_per_call + self.cost_per_image * len(images))
+        results = []
+        for image in images:
+            boxes = [self.plume_box]
+            for i in range(self.extra_boxes):
+                x = 40 + 80 * i
+                boxes.append((x, 40, x + 50, 90))
+            xyxy = np.array(boxes, dtype=np.float32) * (image.shape[1] / self.full_width)
+            results.append(StandInResult(StandInBoxes(xyxy, np.full(len(boxes), 0.5, dtype=np.float32))))
+        return results
+
+class StandInClassifier:
+    """
+    Implements the FireClassifier inference API with a fixed cost per crop
+    going through the backbone and per sequence going through the LSTM.
+    """
+
+    def __init__(self, cost_per_crop=0.0, cost_per_sequence=0.0):
+        self.cost_per_crop = cost_per_crop
+        self.cost_per_sequence = cost_per_sequence
+
+    def infer_features(self, frames):
+        burn_cpu(self.cost_per_crop * len(frames))
+        return torch.zeros(len(frames), 2048)
+
+    def infer_from_features(self, features):
+        burn_cpu(self.cost_per_sequence * len(features))
+        return [0.0] * len(features)
+
+    def infer_batch(self, sequences):
+        burn_cpu(sum(self.cost_per_crop * len(frames) + self.cost_per_sequence for frames in sequences))
+        return [0.0] * len(sequences)
+
+def make_synthetic_dataset(data_dir, num_folders, frames_per_folder, height, width, seed=0):
+    """
+    Write timestamped camera folders with a slowly growing bright plume and a
+    matching fire_truth.json (ignition at the middle frame of each folder).
+    """
+    rng = np.random.default_rng(seed)
+    plume_box = (width // 2, height // 3, width // 2 + 80, height // 3 + 80)
+    ignition_times = []
+    start = datetime(2020, 6, 1, 12, 0, 0)
+    for folder_idx in range(num_folders):
+        folder_name = f"{start + timedelta(days=folder_idx):%Y%m%d}_SYNTH_cam{folder_idx}"
+        folder_path = os.path.join(data_dir, folder_name)
+        os.makedirs(folder_path, exist_ok=True)
+        background = rng.integers(0, 120, size=(height, width, 3), dtype=np.uint8)
+        ignition_idx = frames_per_folder // 2
+        for frame_idx in range(frames_per_folder):
+            frame = background.copy()
+            if frame_idx >= ignition_idx:
+                x1, y1, x2, y2 = plume_box
+                growth = min(frame_idx - ignition_idx, 40)
+                frame[y1 - growth // 2:y2, x1:x2 + growth] = 220
+            frame_time = start + timedelta(days=folder_idx, minutes=frame_idx)
+            cv2.imwrite(os.path.join(folder_path, f"{folder_name}_{frame_time:%Y_%m_%dT%H_%M_%S}.jpg"), frame)
+            if frame_idx == ignition_idx:
+                ignition_times.append({"folder": folder_name, "ignition_time": f"{frame_time:%Y-%m-%d %H:%M:%S}"})
+
+    ignition_time_path = os.path.join(data_dir, 'fire_truth.json')
+    with open(ignition_time_path, 'w', encoding='utf-8') as f:
+        json.dump(ignition_times, f, indent=4)
+    return plume_box, ignition_times
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_scenario(data_dir, output_dir, yolo_model, lstm_resnet_model, ignition_times, args):
+    timer = SampleTimer()
+    folders = sorted(f for f in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, f)))
+    start = time.perf_counter()
+    for folder_name in folders:
+        process_files_in_folder(
+            os.path.join(data_dir, folder_name), os.path.join(output_dir, folder_name),
+            yolo_model, lstm_resnet_model, ignition_times,
+            args.confidence_threshold, args.frames_back,
+            args.yolo_batch_size, args.feature_cache_size, timer,
+            motion_threshold=args.motion_threshold, decode_scale=args.decode_scale,
+            prefetch_frames=args.prefetch_frames, prefetch_workers=args.prefetch_workers
+        )
+    wall_seconds = time.perf_counter() - start
+    return scenario_results(timer, wall_seconds)
+
+def run_multi_camera_scenario(data_dir, yolo_model, lstm_resnet_model, args):
+    """
+    Run every synthetic folder as a concurrent camera stream through the
+    InferenceScheduler, which batches detector and verifier calls across cameras.
+    """
+    timer = SampleTimer()
+    folders = sorted(f for f in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, f)))
+    scheduler = InferenceScheduler(
+        yolo_model, lstm_resnet_model, args.confidence_threshold,
+        len(folders), args.max_batch_delay_ms / 1000, timer
+    )
+
+    async def run_all():
+        await asyncio.gather(*(
+            scheduler.run_stream(
+                SequenceDetector(lstm_resnet_model, args.frames_back, args.feature_cache_size,
+                                 confidence_threshold=args.confidence_threshold),
+                ImageFolderSource(os.path.join(data_dir, folder_name))
+            )
+            for folder_name in folders
+        ))
+
+    start = time.perf_counter()
+    asyncio.run(run_all())
+    wall_seconds = time.perf_counter() - start
+    scheduler.close()
+
+    results = scenario_results(timer, wall_seconds)
+    results["mean_detector_batch"] = scheduler.detect_batcher.mean_batch_size()
+    results["mean_verifier_batch"] = scheduler.verify_batcher.mean_batch_size()
+    return results
+
+def scenario_results(timer, wall_seconds):
+    frame_seconds = timer.samples.get('frame', [])
+    return {
+        "frames": len(frame_seconds),
+        "wall_seconds": wall_seconds,
+        "frames_per_second": len(frame_seconds) / wall_seconds if wall_seconds > 0 else None,
+        "p50_frame_seconds": float(np.percentile(frame_seconds, 50)) if frame_seconds else None,
+        "p95_frame_seconds": float(np.percentile(frame_seconds, 95)) if frame_seconds else None,
+        # Process-wide high-water mark, so it never decreases between scenarios
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": timer.to_dict(),
+    }
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Return a list of human-readable regressions: throughput dropping or p95
+    latency growing by more than `tolerance` (relative) in any shared scenario.
+    """
+    regressions = []
+    for name, current in results["scenarios"].items():
+        reference = baseline.get("scenarios", {}).get(name)
+        if reference is None:
+            continue
+        if reference.get("frames_per_second") and current["frames_per_second"] < reference["frames_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {current['frames_per_second']:.2f} frames/s vs baseline {reference['frames_per_second']:.2f}"
+            )
+        if reference.get("p95_frame_seconds") and current["p95_frame_seconds"] > reference["p95_frame_seconds"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {current['p95_frame_seconds']:.4f} s vs baseline {reference['p95_frame_seconds']:.4f} s"
+            )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput benchmark for the video evaluator on synthetic sequences")
+    parser.add_argument('--output', type=str, default='benchmark_results.json', help='Where to write the results JSON')
+    parser.add_argument('--baseline', type=str, help='Results JSON from a previous run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed relative slowdown before flagging a regression')
+    parser.add_argument('--data_dir', type=str, help='Keep the synthetic dataset here instead of a temporary folder')
+    parser.add_argument('--num_folders', type=int, default=2)
+    parser.add_argument('--frames_per_folder', type=int, default=40)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--frames_back', type=int, default=5)
+    parser.add_argument('--confidence_threshold', type=float, default=0.05)
+    parser.add_argument('--yolo_batch_size', type=int, default=1)
+    parser.add_argument('--feature_cache_size', type=int, default=512)
+    parser.add_argument('--prefetch_frames', type=int, default=0, help='Frames decoded ahead in background threads')
+    parser.add_argument('--prefetch_workers', type=int, default=2)
+    parser.add_argument('--decode_scale', type=int, default=1, choices=[1, 2, 4, 8], help='Reduced-resolution JPEG decode for the detector')
+    parser.add_argument('--motion_threshold', type=float, help='Enable the motion gate with this changed-pixel fraction')
+    parser.add_argument('--max_batch_delay_ms', type=float, default=50.0, help='Scheduler batching delay in the multi-camera scenario')
+    parser.add_argument('--detector_cost_ms', type=float, default=20.0, help='Stand-in YOLO cost per image')
+    parser.add_argument('--detector_call_cost_ms', type=float, default=5.0, help='Stand-in YOLO overhead per call')
+    parser.add_argument('--crop_cost_ms', type=float, default=10.0, help='Stand-in backbone cost per crop')
+    parser.add_argument('--extra_boxes', type=int, default=1, help='Distractor boxes per frame besides the plume')
+    parser.add_argument('--checkpoint', type=str, help='FireClassifier checkpoint for the real-classifier scenario')
+    parser.add_argument('--skip_real_classifier', action='store_true', help='Only run the stand-in scenarios')
+    parser.add_argument('--torch_threads', type=int, help='Torch intra-op threads (default: torch default)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    logger.setLevel(logging.INFO)
+
+    torch.manual_seed(args.seed)
+    if args.torch_threads:
+        torch.set_num_threads(args.torch_threads)
+
+    work_dir = tempfile.mkdtemp(prefix='wildfire_benchmark_')
+    data_dir = args.data_dir or os.path.join(work_dir, 'data')
+    try:
+        logger.info(f"Generating synthetic dataset in {data_dir}")
+        plume_box, ignition_times = make_synthetic_dataset(
+            data_dir, args.num_folders, args.frames_per_folder, args.height, args.width, args.seed
+        )
+
+        detector = StandInDetector(
+            plume_box, args.width, args.detector_call_cost_ms / 1000, args.detector_cost_ms / 1000, args.extra_boxes
+        )
+        scenarios = {
+            "stand_in_yolo_only": (detector, None),
+            "stand_in_pipeline": (detector, StandInClassifier(args.crop_cost_ms / 1000)),
+        }
+        if not args.skip_real_classifier:
+            from models.lstm_resnet.fire_classifier import FireClassifier
+            if args.checkpoint:
+                classifier = FireClassifier.load_from_checkpoint(args.checkpoint, map_location='cpu')
+            else:
+                classifier = FireClassifier()
+            scenarios["real_fire_classifier_cpu"] = (detector, classifier.cpu().eval())
+
+        results = {
+            "created": f"{datetime.now():%Y-%m-%d %H:%M:%S}",
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "torch": torch.__version__,
+                "torch_threads": torch.get_num_threads(),
+            },
+            "settings": vars(args),
+            "scenarios": {},
+        }
+        # Same stand-in models, all folders evaluated concurrently as camera streams
+        scenarios["stand_in_pipeline_multi_camera"] = scenarios["stand_in_pipeline"]
+        for name, (yolo_model, lstm_resnet_model) in scenarios.items():
+            logger.info(f"Running scenario {name}")
+            if name.endswith('_multi_camera'):
+                results["scenarios"][name] = run_multi_camera_scenario(data_dir, yolo_model, lstm_resnet_model, args)
+            else:
+                output_dir = os.path.join(work_dir, 'output', name)
+                results["scenarios"][name] = run_scenario(data_dir, output_dir, yolo_model, lstm_resnet_model, ignition_times, args)
+            scenario = results["scenarios"][name]
+            logger.info(
+                f"{name}: {scenario['frames_per_second']:.2f} frames/s, "
+                f"p50 {scenario['p50_frame_seconds']:.4f} s, p95 {scenario['p95_frame_seconds']:.4f} s"
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4)
+    logger.info(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            logger.warning(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        logger.info("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,35 @@
 import os
 import argparse
 import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
+import torch
 from models.model_loader import load_model
-from utils.ignition_time import load_ignition_times
+from utils.folder_index import FolderIndex
 from utils.file_processor import process_files_in_folder
+from utils.frame_source import CLASSIFIER_INPUT_SIZE, VideoFileSource, is_video_file, list_video_folders
+from utils.live import watch_folders
 from utils.analysis import calculate_detection_metrics, save_metrics_as_txt
+from utils.timing import StageTimer
+from utils.artifact_writer import ArtifactWriter
+from utils.prediction_store import PredictionStore
 import statistics
 
 CONFIG_PATH = 'config'
 
+logger = logging.getLogger(__name__)
+
+def setup_logging(log_level):
+    """
+    Configure levelled console logging; per-frame details are logged at DEBUG.
+    """
+    logging.basicConfig(
+        level=log_level,
+        format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+    )
+
 def save_config_to_file(config, output_folder):
     """
     Save the used configuration dict as JSON in the output folder.
@@ -17,21 +37,113 @@ def save_config_to_file(config, output_folder):
     config_file_path = os.path.join(output_folder, 'config_used.json')
     with open(config_file_path, 'w', encoding='utf-8') as f:
         json.dump(config, f, indent=4)
-    print(f"Configuration saved to {config_file_path}")
+    logger.info(f"Configuration saved to {config_file_path}")
 
-def save_predictions_to_json(all_detection_data, output_file):
+def save_timings_to_json(all_detection_data, output_folder):
+    """
+    Write per-stage timings for each folder and merged over the whole run.
+    """
+    overall = StageTimer()
+    folders = {}
+    prefetch = {}
+    for detection in all_detection_data:
+        timings = detection.get('timings')
+        if timings:
+            folders[detection['folder_name']] = timings
+            overall.merge(StageTimer.from_dict(timings))
+        if detection.get('prefetch'):
+            prefetch[detection['folder_name']] = detection['prefetch']
+
+    data_to_save = {"overall": overall.to_dict(), "folders": folders}
+    if prefetch:
+        data_to_save["prefetch"] = prefetch
+    timings_file_path = os.path.join(output_folder, 'timings.json')
+    with open(timings_file_path, 'w', encoding='utf-8') as f:
+        json.dump(data_to_save, f, indent=4)
+    logger.info(f"Timings saved to {timings_file_path}")
+
+def save_predictions_to_json(prediction_store, output_file):
     """
     Write frame‐by‐frame predictions for each folder into a JSON file.
     """
     data_to_save = []
-    for detection in all_detection_data:
-        folder = detection['folder_name']
-        predictions = detection["frame_predictions"]
+    for folder in prediction_store.folder_names():
+        predictions = prediction_store.frame_predictions(folder)
         data_to_save.append([folder] + predictions)
 
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(data_to_save, f)
-    print(f"Predictions saved to {output_file}")
+    logger.info(f"Predictions saved to {output_file}")
+
+def load_models(config):
+    """
+    Load the YOLO detector and, if configured, the LSTM-ResNet verifier.
+    """
+    yolo_model = load_model(config['model_type'], config['model_version'])
+    if config['lstm_resnet_model_type']:
+        lstm_resnet_model = load_model(config['lstm_resnet_model_type'], config['lstm_resnet_model_version'])
+    else:
+        lstm_resnet_model = None
+    return yolo_model, lstm_resnet_model
+
+def evaluate_folder(folder_path, output_folder, frames, yolo_model, lstm_resnet_model, ignition_times, config, writer=None):
+    """
+    Run the detection pipeline on one folder (or video file) with the settings from config.
+    """
+    source = None
+    if is_video_file(folder_path):
+        source = VideoFileSource(folder_path, fps=config.get('video_fps'), frame_step=config.get('video_frame_step', 1))
+    return process_files_in_folder(
+        folder_path, output_folder,
+        yolo_model, lstm_resnet_model,
+        ignition_times, config['confidence_threshold'], config['frames_back'],
+        config.get('yolo_batch_size', 1), config.get('feature_cache_size', 512),
+        frames=frames, writer=writer,
+        lstm_threshold=config.get('lstm_threshold', 0.5),
+        raw_score_floor=config.get('raw_score_floor'),
+        source=source,
+        motion_threshold=config.get('motion_threshold'),
+        motion_max_skip=config.get('motion_max_skip', 10),
+        track_reverify_every=config.get('track_reverify_every', 0),
+        track_max_drift=config.get('track_max_drift', 0.1),
+        track_max_growth=config.get('track_max_growth', 0.2),
+        decode_scale=config.get('decode_scale', 1),
+        min_crop_side=config.get('reduced_crop_min_side', CLASSIFIER_INPUT_SIZE),
+        prefetch_frames=config.get('prefetch_frames', 0),
+        prefetch_workers=config.get('prefetch_workers', 2)
+    )
+
+# Per-process state of the evaluation pool, filled once by init_worker
+_worker_state = {}
+
+def init_worker(config, ignition_times, torch_threads):
+    """
+    Pool initializer: cap torch threads and load the models once per worker.
+    """
+    setup_logging(config.get('log_level', 'INFO'))
+    torch.set_num_threads(torch_threads)
+    yolo_model, lstm_resnet_model = load_models(config)
+    _worker_state.update(
+        config=config,
+        ignition_times=ignition_times,
+        yolo_model=yolo_model,
+        lstm_resnet_model=lstm_resnet_model,
+        writer=ArtifactWriter(enabled=config.get('save_artifacts', True)),
+    )
+
+def evaluate_folder_in_worker(job):
+    """
+    Evaluate one (folder_path, output_folder, frames) job with the worker's models.
+    """
+    folder_path, output_folder, frames = job
+    detection_data = evaluate_folder(
+        folder_path, output_folder, frames,
+        _worker_state['yolo_model'], _worker_state['lstm_resnet_model'],
+        _worker_state['ignition_times'], _worker_state['config'], _worker_state['writer']
+    )
+    # The folder's artifacts must be on disk before the result is handed back
+    _worker_state['writer'].flush()
+    return detection_data
 
 def main():
     parser = argparse.ArgumentParser(description="Wildfire detection evaluation")
@@ -41,10 +153,31 @@ def main():
         default=os.path.join(CONFIG_PATH, 'example.json'),
         help='Path to the configuration file'
     )
+    parser.add_argument(
+        '--watch',
+        type=str,
+        nargs='+',
+        help='Camera folders to watch; new frames are evaluated as they arrive'
+    )
+    parser.add_argument(
+        '--poll_interval',
+        type=float,
+        default=2.0,
+        help='Seconds between folder scans in --watch mode'
+    )
+    parser.add_argument(
+        '--resume',
+        type=str,
+        help='evaluation_<timestamp> folder of an interrupted run; only folders missing from its predictions are evaluated'
+    )
     args = parser.parse_args()
 
-    with open(args.config, 'r', encoding='utf-8') as f:
+    # A resumed run keeps the configuration it was started with
+    config_path = os.path.join(args.resume, 'config_used.json') if args.resume else args.config
+    with open(config_path, 'r', encoding='utf-8') as f:
         config = json.load(f)
+
+    setup_logging(config.get('log_level', 'INFO'))
     
     main_path               = config['main_path']
     output_path             = config['output_path']
@@ -54,74 +187,116 @@ def main():
     lstm_resnet_model_version = config['lstm_resnet_model_version']
     ignition_time_path      = config['ignition_time_path']
     video_folder            = config['video_folder']
-    confidence_threshold    = config['confidence_threshold']
-    frames_back             = config['frames_back']
+    num_workers             = config.get('num_workers', 1)
 
-    yolo_model = load_model(yolo_model_type, yolo_model_version)
-    if lstm_resnet_model_type:
-        lstm_resnet_model = load_model(lstm_resnet_model_type, lstm_resnet_model_version)
-    else:
-        lstm_resnet_model = None
+    if args.watch:
+        yolo_model, lstm_resnet_model = load_models(config)
+        watch_folder = os.path.join(output_path, f"watch_{datetime.now():%Y%m%d_%H%M%S}")
+        os.makedirs(watch_folder)
+        save_config_to_file(config, watch_folder)
+        watch_folders(args.watch, yolo_model, lstm_resnet_model, config, watch_folder, args.poll_interval)
+        return
 
-    ignition_times = load_ignition_times(ignition_time_path)
+    # With a process pool every worker loads its own copy of the models
+    if num_workers <= 1:
+        yolo_model, lstm_resnet_model = load_models(config)
 
     os.makedirs(output_path, exist_ok=True)
 
-    evaluation_id     = f"evaluation_{datetime.now():%Y%m%d_%H%M%S}"
-    evaluation_folder = os.path.join(output_path, evaluation_id)
-    os.makedirs(evaluation_folder)
+    # Sorted frames and ignition times are indexed once per dataset and reused across runs
+    folder_index   = FolderIndex(config.get('frame_index_path', os.path.join(output_path, 'frame_index.json')))
+    ignition_times = folder_index.ignition_times(ignition_time_path)
 
-    save_config_to_file(config, evaluation_folder)
+    if args.resume:
+        # Folders listed in the store's manifest were fully evaluated before the interruption
+        evaluation_folder = args.resume
+        prediction_store  = PredictionStore.open(os.path.join(evaluation_folder, 'predictions'))
+        logger.info(f"Resuming {evaluation_folder}: {len(prediction_store.folder_names())} folders already evaluated")
+    else:
+        evaluation_id     = f"evaluation_{datetime.now():%Y%m%d_%H%M%S}"
+        evaluation_folder = os.path.join(output_path, evaluation_id)
+        os.makedirs(evaluation_folder)
 
-    all_detection_data = []
-    all_metrics        = []
+        save_config_to_file(config, evaluation_folder)
 
-    print(f"Processing files in {main_path}")
-    print(f"Saving results to {evaluation_folder}")
-    print(f"YOLO model: {yolo_model_type} (version {yolo_model_version})")
-    print(f"LSTM-ResNet model: {lstm_resnet_model_type} (version {lstm_resnet_model_version})")
-    print(f"Video folder setting: {video_folder!r}")
+        # Per-frame states and raw boxes go to a columnar store, one folder at a time
+        prediction_store = PredictionStore.create(os.path.join(evaluation_folder, 'predictions'), {
+            "confidence_threshold": config['confidence_threshold'],
+            "lstm_threshold": config.get('lstm_threshold', 0.5),
+        })
 
-    if video_folder:
-        folder_path   = os.path.join(main_path, video_folder)
-        output_folder = os.path.join(evaluation_folder, video_folder)
-        os.makedirs(output_folder, exist_ok=True)
+    failed_folders = []
 
-        print(f"Processing folder: {folder_path}")
-        detection_data = process_files_in_folder(
-            folder_path, output_folder,
-            yolo_model, lstm_resnet_model,
-            ignition_times, confidence_threshold, frames_back
-        )
-        metric = calculate_detection_metrics(detection_data)
-        all_metrics.append(metric)
-        all_detection_data.append(detection_data)
+    def collect(folder_path, evaluate):
+        # A failed folder is left out of the store, so --resume retries it
+        try:
+            detection_data = evaluate()
+        except Exception:
+            logger.exception(f"Evaluation of {folder_path} failed")
+            failed_folders.append(folder_path)
+            return
+        if detection_data is not None:
+            prediction_store.append(detection_data)
+
+    logger.info(f"Processing files in {main_path}")
+    logger.info(f"Saving results to {evaluation_folder}")
+    logger.info(f"YOLO model: {yolo_model_type} (version {yolo_model_version})")
+    logger.info(f"LSTM-ResNet model: {lstm_resnet_model_type} (version {lstm_resnet_model_version})")
+    logger.info(f"Video folder setting: {video_folder!r}")
+
+    jobs = []
+    for folder_path, folder_name in list_video_folders(main_path, video_folder):
+        if folder_name in prediction_store:
+            continue
+        output_folder = os.path.join(evaluation_folder, folder_name)
+        os.makedirs(output_folder, exist_ok=True)
+        frames = None if is_video_file(folder_path) else folder_index.frames(folder_path)
+        jobs.append((folder_path, output_folder, frames))
+    folder_index.save()
 
+    if num_workers > 1:
+        # Split the cores between workers so torch does not oversubscribe the CPU
+        torch_threads = config.get('torch_threads') or max(1, (os.cpu_count() or 1) // num_workers)
+        logger.info(f"Evaluating {len(jobs)} folders with {num_workers} workers ({torch_threads} torch threads each)")
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+            initargs=(config, ignition_times, torch_threads),
+        ) as executor:
+            futures = {executor.submit(evaluate_folder_in_worker, job): job[0] for job in jobs}
+            # Each folder is recorded as soon as it finishes, whatever the submission order
+            for future in as_completed(futures):
+                collect(futures[future], future.result)
     else:
-        for root, dirs, files in os.walk(main_path):
-            for dir_name in dirs:
-                if "labels" in dir_name.lower():
-                    print(f"Ignoring folder: {dir_name}")
-                    continue
-
-                folder_path   = os.path.join(root, dir_name)
-                output_folder = os.path.join(evaluation_folder, dir_name)
-                os.makedirs(output_folder, exist_ok=True)
-
-                print(f"Processing folder: {folder_path}")
-                detection_data = process_files_in_folder(
-                    folder_path, output_folder,
-                    yolo_model, lstm_resnet_model,
-                    ignition_times, confidence_threshold, frames_back
-                )
-                if detection_data is not None:
-                    metric = calculate_detection_metrics(detection_data)
-                    all_metrics.append(metric)
-                    all_detection_data.append(detection_data)
-
-    # Save all per‐video predictions
-    output_json_path = os.path.join(evaluation_folder, 'state_all_videos.json')
-    save_predictions_to_json(all_detection_data, output_json_path)
+        # A shared writer lets one folder's plots render while the next folder runs
+        with ArtifactWriter(enabled=config.get('save_artifacts', True)) as writer:
+            for folder_path, output_folder, frames in jobs:
+                collect(folder_path, lambda: evaluate_folder(folder_path, output_folder, frames, yolo_model, lstm_resnet_model, ignition_times, config, writer))
+
+    if failed_folders:
+        logger.error(f"{len(failed_folders)} folders failed and were not recorded; run with --resume {evaluation_folder} to retry them")
+
+    # Global outputs are rebuilt from every folder in the store, including earlier runs of a resumed evaluation
+    all_detection_data = prediction_store.detection_summaries()
+    all_metrics        = [calculate_detection_metrics(detection_data) for detection_data in all_detection_data]
+
+    if config.get('motion_threshold') is not None:
+        gated_frames = sum(detection.get('gated_frames') or 0 for detection in all_detection_data)
+        total_frames = sum(detection['total_frames'] for detection in all_detection_data)
+        logger.info(f"Motion gate: YOLO skipped on {gated_frames} of {total_frames} frames")
+
+    if config.get('track_reverify_every', 0) > 1:
+        reused = sum(detection.get('reused_verifications') or 0 for detection in all_detection_data)
+        verified = sum(detection.get('verifications') or 0 for detection in all_detection_data)
+        if reused + verified:
+            logger.info(f"Tracker: {reused} of {reused + verified} classifier scores reused ({reused / (reused + verified):.1%})")
+
+    if config.get('save_state_json', False):
+        output_json_path = os.path.join(evaluation_folder, 'state_all_videos.json')
+        save_predictions_to_json(prediction_store, output_json_path)
+
+    save_timings_to_json(all_detection_data, evaluation_folder)
 
     # Compute and save global precision/recall/F1 if available
     if all_metrics:
@@ -138,9 +313,9 @@ def main():
             }
             global_metrics_file = os.path.join(evaluation_folder, 'global_metrics.txt')
             save_metrics_as_txt(global_metrics, evaluation_folder, filename='global_metrics.txt')
-            print(f"Global metrics saved to {global_metrics_file}")
+            logger.info(f"Global metrics saved to {global_metrics_file}")
         else:
-            print("No files with sufficient metrics to calculate averages.")
+            logger.warning("No files with sufficient metrics to calculate averages.")
 
     # Compute and save delay statistics
     delays          = []
@@ -167,8 +342,8 @@ def main():
         else:
             delay_file.write("\nNo valid delays found for statistics.\n")
 
-    print(f"Delays and statistics saved to {delay_file_path}")
-    print("Processing completed.")
+    logger.info(f"Delays and statistics saved to {delay_file_path}")
+    logger.info("Processing completed.")
 
 if __name__ == "__main__":
     main()
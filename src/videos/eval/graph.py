@@ -1,7 +1,7 @@
-import json
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.colors import ListedColormap
+from utils.prediction_store import PredictionStore
 
 choosen_wildfires = [
     "20180504_FIRE_smer-tcs8-mobo-c",
@@ -29,10 +29,11 @@ choosen_wildfires = [
     "20170520_FIRE_lp-s-iqeye",
 ]
 
-experiment_name = "experiments/example/all_states.json"
+experiment_name = "example"
 
-with open(f"experiments/{experiment_name}/all_states.json", "r") as f:
-    incendios2 = json.load(f)
+# Only the chosen folders' rows are read from the memory-mapped store
+store = PredictionStore.open(f"experiments/{experiment_name}/predictions")
+incendios2 = [[nombre] + store.frame_predictions(nombre) for nombre in choosen_wildfires if nombre in store]
 
 n = 20
 fires = len(choosen_wildfires)
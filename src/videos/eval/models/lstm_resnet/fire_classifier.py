@@ -21,8 +21,16 @@ class FireClassifier(pl.LightningModule):
     def forward(self, x):
         batch_size, seq_length, C, H, W = x.size()
         x = x.view(batch_size * seq_length, C, H, W)
-        x = self.feature_extractor(x)
+        x = self.extract_features(x)
         x = x.view(batch_size, seq_length, -1)
+        return self.forward_features(x)
+
+    def extract_features(self, x):
+        # (N, C, H, W) -> (N, 2048) backbone features
+        return self.feature_extractor(x).flatten(1)
+
+    def forward_features(self, x):
+        # (B, T, 2048) -> (B, 1) logits
         x, _ = self.lstm(x)
         x = x[:, -1, :]
         x = self.classifier(x)
@@ -36,13 +44,43 @@ class FireClassifier(pl.LightningModule):
 
     def infer_5_frames(self, image_paths):
         images = [Image.open(img_path) for img_path in image_paths]
-        
-        preprocessed_images = [self.preprocess_image(img).unsqueeze(0) for img in images]
-        
-        input_tensor = torch.cat(preprocessed_images).unsqueeze(0).to(self.device)
+        return self.infer_images(images)
+
+    def infer_sequence(self, frames):
+        # frames: RGB uint8 arrays (H, W, 3), oldest first, already cropped
+        return self.infer_batch([frames])[0]
+
+    def infer_batch(self, sequences):
+        # sequences: one list of RGB crops per candidate box, all of the same length
+        input_tensor = torch.stack([
+            self.preprocess_sequence([Image.fromarray(frame) for frame in frames])
+            for frames in sequences
+        ])
+        return self.predict(input_tensor)
+
+    def infer_features(self, frames):
+        # frames: RGB crops, returns their backbone features so callers can cache them
+        input_tensor = self.preprocess_sequence([Image.fromarray(frame) for frame in frames])
+        self.eval()
+        with torch.no_grad():
+            return self.extract_features(input_tensor.to(self.device))
+
+    def infer_from_features(self, features):
+        # features: (B, T, 2048) as returned by infer_features, one score per sequence
+        self.eval()
+        with torch.no_grad():
+            output = torch.sigmoid(self.forward_features(features.to(self.device)))
+            return output.view(-1).tolist()
+
+    def infer_images(self, images):
+        input_tensor = self.preprocess_sequence(images).unsqueeze(0)
+        return self.predict(input_tensor)[0]
+
+    def preprocess_sequence(self, images):
+        return torch.stack([self.preprocess_image(img) for img in images])
 
+    def predict(self, input_tensor):
         self.eval()
         with torch.no_grad():
-            output = torch.sigmoid(self(input_tensor))
-            pred = output.item()
-            return pred
\ No newline at end of file
+            output = torch.sigmoid(self(input_tensor.to(self.device)))
+            return output.view(-1).tolist()
@@ -0,0 +1,152 @@
+import csv
+import logging
+import argparse
+import numpy as np
+from utils.prediction_store import PredictionStore
+
+logger = logging.getLogger(__name__)
+
+def parse_thresholds(spec):
+    """
+    Parse 'start:stop:step' (stop included) or a comma-separated list of values.
+    """
+    if ':' in spec:
+        start, stop, step = (float(v) for v in spec.split(':'))
+        return np.round(np.arange(start, stop + step / 2, step), 6)
+    return np.array([float(v) for v in spec.split(',')])
+
+def to_microseconds(epochs):
+    return np.round(np.asarray(epochs, dtype=np.float64) * 1_000_000).astype(np.int64)
+
+def folder_metrics(store, folder_name, yolo_thresholds, lstm_thresholds):
+    """
+    Per-folder precision, recall, F1 and detection delay for every
+    (lstm threshold, yolo threshold) pair, each an (L, Y) array with NaN
+    where the evaluator would report None.
+
+    A frame counts as detected when any box has a YOLO confidence above the
+    YOLO threshold and, with a temporal model, a classifier score above the
+    LSTM threshold, exactly as in SequenceDetector.update.
+    """
+    folder = store.summary(folder_name)
+    # Whole microseconds, so equality and the delay match the evaluator's datetime arithmetic
+    times = to_microseconds(store.frames(folder_name)['timestamp'])
+    num_frames = len(times)
+    num_lstm, num_yolo = len(lstm_thresholds), len(yolo_thresholds)
+
+    # Only this folder's rows of the memory-mapped box table are read
+    boxes = store.boxes(folder_name)
+    frame_ids = np.asarray(boxes['frame_index'], dtype=np.int64)
+    confs = np.asarray(boxes['yolo_conf'], dtype=np.float64)
+    scores = np.asarray(boxes['score'], dtype=np.float64)
+
+    # Highest YOLO confidence per frame among the boxes the classifier accepts
+    best_conf = np.full((num_lstm, num_frames), -np.inf)
+    for l, lstm_threshold in enumerate(lstm_thresholds):
+        accepted = scores > lstm_threshold if folder["has_classifier"] else np.ones(len(confs), dtype=bool)
+        np.maximum.at(best_conf[l], frame_ids[accepted], confs[accepted])
+    detected = best_conf[:, None, :] > yolo_thresholds[None, :, None]
+
+    ignition = to_microseconds(folder["ignition_time"]) if folder["ignition_time"] is not None else None
+    after = times >= ignition if ignition is not None else np.zeros(num_frames, dtype=bool)
+    tp = (detected & after).sum(-1)
+    fp = (detected & ~after).sum(-1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), np.nan)
+        recall = np.where(after.sum() > 0, tp / after.sum(), np.nan) * np.ones_like(precision)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), np.nan)
+
+    # The delay is only measured from a frame taken exactly at ignition time
+    delay = np.full((num_lstm, num_yolo), np.nan)
+    ignition_frames = np.flatnonzero(times == ignition) if ignition is not None else []
+    if len(ignition_frames):
+        start = ignition_frames[0]
+        later = detected[:, :, start:]
+        first = start + later.argmax(-1)
+        # Like timedelta.seconds: whole seconds within a day
+        seconds = (times[first] - ignition) // 1_000_000 % 86400
+        delay = np.where(later.any(-1), seconds // 60, np.nan)
+
+    return precision, recall, f1, delay
+
+def sweep(store, yolo_thresholds, lstm_thresholds):
+    """
+    Average the per-folder metrics over folders the way eval.py does and
+    return one row per threshold pair.
+    """
+    per_folder = [folder_metrics(store, name, yolo_thresholds, lstm_thresholds) for name in store.folder_names()]
+    precision, recall, f1, delay = (np.stack(values) for values in zip(*per_folder))
+
+    # Folders without a defined precision are left out of the averages, as in eval.py
+    valid = ~np.isnan(precision)
+    with np.errstate(invalid='ignore'):
+        mean_precision = np.nanmean(np.where(valid, precision, np.nan), axis=0)
+        mean_recall = np.nanmean(np.where(valid, recall, np.nan), axis=0)
+        mean_f1 = np.nanmean(np.where(valid, f1, np.nan), axis=0)
+        delays_found = (~np.isnan(delay)).sum(0)
+        mean_delay = np.nanmean(delay, axis=0)
+        std_delay = np.where(delays_found > 1, np.nanstd(delay, axis=0, ddof=1), 0.0)
+
+    rows = []
+    for l, lstm_threshold in enumerate(lstm_thresholds):
+        for y, yolo_threshold in enumerate(yolo_thresholds):
+            rows.append({
+                "yolo_threshold": float(yolo_threshold),
+                "lstm_threshold": float(lstm_threshold),
+                "precision": float(mean_precision[l, y]),
+                "recall": float(mean_recall[l, y]),
+                "f1_score": float(mean_f1[l, y]),
+                "mean_delay": float(mean_delay[l, y]) if delays_found[l, y] else None,
+                "std_delay": float(std_delay[l, y]) if delays_found[l, y] else None,
+                "folders_with_delay": int(delays_found[l, y]),
+            })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute video metrics over a grid of YOLO/LSTM thresholds from a run's prediction store")
+    parser.add_argument('--predictions', type=str, required=True, help='predictions folder written by eval.py')
+    parser.add_argument('--yolo_thresholds', type=str, default='0.05:0.5:0.05', help="'start:stop:step' or comma-separated values")
+    parser.add_argument('--lstm_thresholds', type=str, default='0.1:0.9:0.1', help="'start:stop:step' or comma-separated values")
+    parser.add_argument('--output', type=str, default='sweep_results.csv', help='CSV file with one row per threshold pair')
+    parser.add_argument('--top', type=int, default=10, help='Number of best F1 rows to print')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    store = PredictionStore.open(args.predictions)
+
+    yolo_thresholds = parse_thresholds(args.yolo_thresholds)
+    lstm_thresholds = parse_thresholds(args.lstm_thresholds)
+
+    # Boxes below the YOLO confidence used during evaluation were never recorded
+    floor = max((store.summary(name)["yolo_conf"] for name in store.folder_names()), default=0.0)
+    if (yolo_thresholds < floor).any():
+        logger.warning(f"Dropping YOLO thresholds below the recorded floor {floor}")
+        yolo_thresholds = yolo_thresholds[yolo_thresholds >= floor]
+    if not len(yolo_thresholds):
+        parser.error(f"every YOLO threshold in '{args.yolo_thresholds}' is below the recorded floor {floor}; "
+                     f"boxes under it were never stored, so use thresholds of at least {floor}")
+    if not len(lstm_thresholds):
+        parser.error(f"no LSTM thresholds in '{args.lstm_thresholds}'")
+    if not store.folder_names():
+        parser.error(f"no folders in the prediction store {args.predictions}")
+
+    rows = sweep(store, yolo_thresholds, lstm_thresholds)
+
+    with open(args.output, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    logger.info(f"Sweep of {len(rows)} threshold pairs saved to {args.output}")
+
+    best_rows = sorted((row for row in rows if not np.isnan(row["f1_score"])), key=lambda row: row["f1_score"], reverse=True)
+    for row in best_rows[:args.top]:
+        delay = f"{row['mean_delay']:.2f}" if row["mean_delay"] is not None else "N/A"
+        logger.info(
+            f"YOLO {row['yolo_threshold']:.3f}, LSTM {row['lstm_threshold']:.3f}: "
+            f"precision {row['precision']:.3f}, recall {row['recall']:.3f}, F1 {row['f1_score']:.3f}, delay {delay}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The evaluator is run from src/videos/eval and imports utils/ and models/ from there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,65 @@
+import pytest
+import torch
+
+from utils.feature_cache import FeatureCache, classify_with_cache
+
+
+class FakeClassifier:
+    """
+    Backbone features are the crops themselves; a sequence scores the sum of its features.
+    """
+
+    def __init__(self):
+        self.backbone_crops = 0
+
+    def infer_features(self, crops):
+        self.backbone_crops += len(crops)
+        return list(crops)
+
+    def infer_from_features(self, sequences):
+        return sequences.sum(dim=(1, 2)).tolist()
+
+
+def crop_fn(images, box):
+    return [torch.tensor([float(image * 100 + box[0])]) for image in images]
+
+
+def expected_scores(frame_buffer, boxes):
+    return [sum(frame_idx * 100 + box[0] for frame_idx, _ in frame_buffer) for box in boxes]
+
+
+def test_eviction_inside_a_window_keeps_cached_features():
+    frames_back = 5
+    model = FakeClassifier()
+    cache = FeatureCache(frames_back, max_entries=frames_back)
+    boxes = [(1, 0, 10, 10), (2, 0, 10, 10)]
+
+    for last in range(frames_back, frames_back + 4):
+        frame_buffer = [(frame_idx, frame_idx) for frame_idx in range(last - frames_back, last + 1)]
+        cache.evict_before(last)
+        scores = classify_with_cache(model, [(cache, frame_buffer, boxes)], crop_fn)
+        assert scores == [expected_scores(frame_buffer, boxes)]
+        assert len(cache.entries) <= frames_back
+
+    assert cache.hits > 0
+
+
+def test_cache_hits_skip_the_backbone():
+    frames_back = 3
+    model = FakeClassifier()
+    cache = FeatureCache(frames_back)
+    box = (1, 0, 10, 10)
+
+    classify_with_cache(model, [(cache, [(i, i) for i in range(4)], [box])], crop_fn)
+    classify_with_cache(model, [(cache, [(i, i) for i in range(1, 5)], [box])], crop_fn)
+    assert model.backbone_crops == 5
+    assert cache.hits == 3
+
+
+def test_sequence_detector_rejects_cache_smaller_than_a_window():
+    from utils.file_processor import SequenceDetector
+
+    with pytest.raises(ValueError):
+        SequenceDetector(FakeClassifier(), frames_back=5, feature_cache_size=5)
+    assert SequenceDetector(FakeClassifier(), frames_back=5, feature_cache_size=6).feature_cache is not None
+    assert SequenceDetector(FakeClassifier(), frames_back=5, feature_cache_size=0).feature_cache is None
@@ -0,0 +1,37 @@
+import os
+
+from utils.frame_source import list_video_folders
+
+
+def make_dirs(root, *paths):
+    for path in paths:
+        os.makedirs(os.path.join(root, path))
+
+
+def test_nested_folders_with_the_same_name_are_listed_once(tmp_path, caplog):
+    make_dirs(tmp_path, "cam_a/fire1", "cam_b/fire1", "cam_b/fire2")
+
+    folders = list_video_folders(str(tmp_path), "")
+
+    names = [name for _, name in folders]
+    assert sorted(names) == ["cam_a", "cam_b", "fire1", "fire2"]
+    assert dict((name, path) for path, name in folders)["fire1"] == str(tmp_path / "cam_a" / "fire1")
+    assert "Skipping" in caplog.text and str(tmp_path / "cam_b" / "fire1") in caplog.text
+
+
+def test_video_file_named_like_a_folder_is_listed_once(tmp_path):
+    make_dirs(tmp_path, "cam_a/fire1")
+    (tmp_path / "fire1.mp4").write_bytes(b"")
+    (tmp_path / "fire2.mp4").write_bytes(b"")
+
+    folders = list_video_folders(str(tmp_path), "")
+
+    names = [name for _, name in folders]
+    assert len(names) == len(set(names))
+    assert sorted(names) == ["cam_a", "fire1", "fire2"]
+
+
+def test_labels_folders_are_ignored(tmp_path):
+    make_dirs(tmp_path, "fire1", "fire1_labels")
+
+    assert [name for _, name in list_video_folders(str(tmp_path), "")] == ["fire1"]
@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils.frame_source import ReducedFrame, detector_box
+
+
+def write_jpeg(path, width, height, orientation=None):
+    pixels = np.random.default_rng(0).integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+    image = Image.fromarray(pixels)
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    image.save(path, exif=exif)
+    return str(path)
+
+
+@pytest.mark.parametrize("orientation", [None, 1, 6, 8])
+@pytest.mark.parametrize("scale", [2, 4, 8])
+def test_shape_matches_full_decode(tmp_path, orientation, scale):
+    path = write_jpeg(tmp_path / "frame.jpg", 1001, 603, orientation)
+    frame = ReducedFrame(path, scale)
+    assert frame.shape == cv2.imread(path).shape
+    reduced_height, reduced_width = frame.image.shape[:2]
+    assert frame.full_resolution_box((0, 0, reduced_width, reduced_height)) == (0, 0, *frame.shape[1::-1])
+
+
+def test_boxes_are_clipped_to_the_frame(tmp_path):
+    # libjpeg rounds 1001 / 8 up to 126 pixels, 1008 at full resolution
+    path = write_jpeg(tmp_path / "frame.jpg", 1001, 603)
+    frame = ReducedFrame(path, 8)
+    x1, y1, x2, y2 = detector_box(frame, np.array([-3.0, 10.5, 130.0, 80.0]))
+    assert (x1, x2) == (0, 1001)
+    assert 0 < y1 < y2 <= 603
+    assert frame.crop((x1, y1, x2, y2)).shape[:2] == (y2 - y1, x2 - x1)
+
+
+def test_full_resolution_frames_keep_detector_boxes():
+    assert detector_box(np.zeros((10, 10, 3)), np.array([1.7, 2.2, 8.9, 9.0])) == (1, 2, 8, 9)
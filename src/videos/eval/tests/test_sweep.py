@@ -0,0 +1,71 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import sweep
+from utils.analysis import build_detection_data, calculate_detection_metrics
+from utils.folder_index import from_epoch, to_epoch
+from utils.prediction_store import PredictionStore
+
+YOLO_THRESHOLDS = np.array([0.2, 0.5, 0.8])
+LSTM_THRESHOLDS = np.array([0.3, 0.7])
+
+
+def make_folder(name, rng, step_seconds, ignition_frame):
+    """
+    Random raw boxes for a video-like folder with sub-second frame times.
+    """
+    start = datetime(2024, 7, 1, 13, 59, 59, 700000)
+    frame_times = [start + timedelta(seconds=i * step_seconds) for i in range(40)]
+    boxes = [
+        [[0, 0, 10, 10, round(rng.random(), 3), round(rng.random(), 3)] for _ in range(rng.randint(0, 2))]
+        for _ in frame_times
+    ]
+    ignition_time = frame_times[ignition_frame] if ignition_frame is not None else None
+    return name, frame_times, ignition_time, boxes
+
+
+def evaluator_data(folder, yolo_threshold, lstm_threshold):
+    name, frame_times, ignition_time, boxes = folder
+    flags = [any(b[4] > yolo_threshold and b[5] > lstm_threshold for b in frame_boxes) for frame_boxes in boxes]
+    return build_detection_data(name, frame_times, ignition_time, flags)
+
+
+def test_epochs_keep_microseconds():
+    timestamp = datetime(2024, 7, 1, 13, 59, 59, 733333)
+    assert from_epoch(to_epoch(timestamp)) == timestamp
+
+
+@pytest.mark.parametrize("step_seconds", [0.4, 1 / 3, 7.25, 61.1])
+def test_sweep_matches_evaluator_with_sub_second_timestamps(tmp_path, step_seconds):
+    rng = random.Random(step_seconds)
+    folders = [make_folder(f"cam{i}", rng, step_seconds, ignition_frame) for i, ignition_frame in enumerate([3, 17, None])]
+
+    store = PredictionStore.create(str(tmp_path / "predictions"))
+    for folder in folders:
+        name, frame_times, ignition_time, boxes = folder
+        detection_data = evaluator_data(folder, 0.0, 0.0)
+        detection_data["raw_scores"] = {
+            "frame_times": [to_epoch(t) for t in frame_times],
+            "ignition_time": to_epoch(ignition_time) if ignition_time is not None else None,
+            "yolo_conf": 0.01,
+            "has_classifier": True,
+            "boxes": boxes,
+        }
+        store.append(detection_data)
+    store = PredictionStore.open(store.path)
+
+    for folder in folders:
+        precision, recall, f1, delay = sweep.folder_metrics(store, folder[0], YOLO_THRESHOLDS, LSTM_THRESHOLDS)
+        for l, lstm_threshold in enumerate(LSTM_THRESHOLDS):
+            for y, yolo_threshold in enumerate(YOLO_THRESHOLDS):
+                detection_data = evaluator_data(folder, yolo_threshold, lstm_threshold)
+                metrics = calculate_detection_metrics(detection_data)
+                for value, expected in ((precision, metrics["precision"]), (recall, metrics["recall"]),
+                                        (f1, metrics["f1_score"]), (delay, detection_data["detection_delay"])):
+                    if expected is None:
+                        assert np.isnan(value[l, y])
+                    else:
+                        assert value[l, y] == pytest.approx(expected)
@@ -1,7 +1,68 @@
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from datetime import datetime, timedelta
 import json
 import os
 
+def build_detection_data(folder_name, frame_times, ignition_time, detected_flags):
+    """
+    Turn per-frame detection flags into the before/after-ignition counts,
+    frame states (+1 correct, -1 wrong, 0 marks the ignition frame) and the
+    detection delay in minutes. Folders without ignition time have no fire.
+    """
+    if ignition_time is None:
+        ignition_time = datetime.combine(datetime.max.date(), datetime.max.time())
+
+    detection_data = {
+        "folder_name": folder_name,
+        "before_ignition_not_detected": 0,
+        "before_ignition_detected": 0,
+        "after_ignition_not_detected": 0,
+        "after_ignition_detected": 0,
+        "detection_delay": None,
+        "total_frames": len(frame_times),
+        "bounding_boxes": [],
+        "frame_predictions": []
+    }
+
+    detected_after_ignition = False
+    for current_time, detected in zip(frame_times, detected_flags):
+        if current_time < ignition_time:
+            if detected:
+                detection_data["before_ignition_detected"] += 1
+                detection_data["frame_predictions"].append(-1)
+            else:
+                detection_data["before_ignition_not_detected"] += 1
+                detection_data["frame_predictions"].append(1)
+
+        elif current_time == ignition_time:
+            if 0 not in detection_data["frame_predictions"]:
+                detection_data["frame_predictions"].append(0)
+            if detected:
+                detection_data["after_ignition_detected"] += 1
+                detection_data["frame_predictions"].append(1)
+            else:
+                detection_data["after_ignition_not_detected"] += 1
+                detection_data["frame_predictions"].append(-1)
+
+        else:
+            if detected:
+                detection_data["after_ignition_detected"] += 1
+                detection_data["frame_predictions"].append(1)
+            else:
+                detection_data["after_ignition_not_detected"] += 1
+                detection_data["frame_predictions"].append(-1)
+        if current_time == ignition_time and not detected_after_ignition:
+            detected_after_ignition = True
+
+        if detected_after_ignition and detected and detection_data["detection_delay"] is None:
+            d_delay = current_time - ignition_time
+            d_delay = timedelta(hours=d_delay.seconds // 3600, minutes=(d_delay.seconds // 60) % 60)
+            d_delay = d_delay.total_seconds()
+            d_delay = int(d_delay) // 60
+            detection_data["detection_delay"] = d_delay
+
+    return detection_data
+
 def calculate_detection_metrics(detection_data):
     before_ignition_total = detection_data["before_ignition_not_detected"] + detection_data["before_ignition_detected"]
     after_ignition_total = detection_data["after_ignition_not_detected"] + detection_data["after_ignition_detected"]
@@ -43,7 +104,9 @@ def plot_metrics(metrics, output_folder, filename='results.png'):
     labels = list(metrics.keys())
     values = [0 if v is None else v for v in metrics.values()]
 
-    fig, ax = plt.subplots(figsize=(10, 6))
+    # Figure instead of pyplot: it keeps no global state, so plots can be rendered from writer threads
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
     bars = ax.barh(labels, values, color='skyblue')
     ax.set_xlabel('Count / Seconds')
     ax.set_title('Detection Metrics')
@@ -52,6 +115,5 @@ def plot_metrics(metrics, output_folder, filename='results.png'):
         width = bar.get_width()
         ax.text(width + 1, bar.get_y() + bar.get_height() / 2, f'{width:.2f}', ha='center', va='center')
 
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_folder, filename))
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(os.path.join(output_folder, filename))
@@ -0,0 +1,67 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import cv2
+
+logger = logging.getLogger(__name__)
+
+class ArtifactWriter:
+    """
+    Background writer for evaluation artifacts (annotated frames, results.txt,
+    plots), so JPEG encoding and figure rendering stay off the frame loop.
+
+    At most `max_pending` jobs are queued; submitting more blocks until one
+    finishes, which bounds the memory held by frames waiting to be written.
+    With enabled=False every job is dropped, for throughput-only runs.
+    """
+
+    def __init__(self, enabled=True, max_workers=2, max_pending=32):
+        self.enabled = enabled
+        self.failures = 0
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='artifact-writer') if enabled else None
+
+    def submit(self, fn, *args, **kwargs):
+        if not self.enabled:
+            return
+        self._slots.acquire()
+        future = self._executor.submit(fn, *args, **kwargs)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+
+    def write_image(self, path, image):
+        self.submit(write_image, path, image)
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+        self._slots.release()
+        error = future.exception()
+        if error is not None:
+            self.failures += 1
+            logger.error(f"Artifact write failed: {error}")
+
+    def flush(self):
+        """
+        Block until every submitted artifact has been written.
+        """
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def write_image(path, image):
+    if not cv2.imwrite(path, image):
+        raise IOError(f"Could not write {path}")
@@ -0,0 +1,117 @@
+from collections import OrderedDict
+
+import torch
+
+from .timing import StageTimer
+
+
+class FeatureCache:
+    """
+    LRU cache of FireClassifier backbone features keyed by (frame index, expanded box).
+
+    Consecutive frames of a static camera tend to produce the same candidate box,
+    so most of a look-back window has already been through the backbone. Entries
+    older than the look-back horizon can never be requested again and are evicted.
+    """
+
+    def __init__(self, horizon, max_entries=512):
+        self.horizon = horizon
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, features):
+        self.entries[key] = features
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def evict_before(self, frame_idx):
+        oldest = frame_idx - self.horizon
+        for key in [key for key in self.entries if key[0] < oldest]:
+            del self.entries[key]
+
+
+def classify_with_cache(lstm_resnet_model, requests, crop_fn, timer=None):
+    """
+    Score one look-back sequence per expanded box, running the backbone only on
+    crops that are not cached yet. Requests from several cameras share a single
+    backbone call and a single LSTM call.
+
+    Args:
+        requests: (feature_cache, frame_buffer, expanded_boxes) per camera, where
+            frame_buffer holds (frame_idx, image) pairs, oldest first, and
+            expanded_boxes is a non-empty list of (x1, y1, x2, y2) crop boxes.
+        crop_fn: crop_fn(images, box) -> list of RGB crops.
+        timer: optional StageTimer receiving 'crop' and 'classifier' timings.
+
+    Returns:
+        One list of scores per request, in box order.
+    """
+    timer = timer or StageTimer()
+    # Features of every (frame_idx, box) of each request. Cached ones are taken
+    # here, since the put() calls below may evict them before they are used.
+    features = [{} for _ in requests]
+    missing_keys = []
+    missing_crops = []
+    for request_idx, (feature_cache, frame_buffer, expanded_boxes) in enumerate(requests):
+        known = features[request_idx]
+        request_missing = []
+        pending = set()
+        for box in expanded_boxes:
+            uncached = []
+            for frame_idx, image in frame_buffer:
+                key = (frame_idx, box)
+                if key in known or key in pending:
+                    continue
+                if key in feature_cache:
+                    known[key] = feature_cache.get(key)
+                else:
+                    uncached.append((frame_idx, image))
+            feature_cache.hits += len(frame_buffer) - len(uncached)
+            if not uncached:
+                continue
+            keys = [(frame_idx, box) for frame_idx, _ in uncached]
+            request_missing.extend(keys)
+            pending.update(keys)
+            with timer.stage('crop'):
+                missing_crops.extend(crop_fn([image for _, image in uncached], box))
+        feature_cache.misses += len(request_missing)
+        missing_keys.extend((request_idx, key) for key in request_missing)
+
+    with timer.stage('classifier'):
+        if missing_crops:
+            computed = lstm_resnet_model.infer_features(missing_crops)
+            for (request_idx, key), feature in zip(missing_keys, computed):
+                features[request_idx][key] = feature
+                requests[request_idx][0].put(key, feature)
+
+        sequences = []
+        for request_idx, (_, frame_buffer, expanded_boxes) in enumerate(requests):
+            sequences.extend(
+                torch.stack([features[request_idx][(frame_idx, box)] for frame_idx, _ in frame_buffer])
+                for box in expanded_boxes
+            )
+        scores = lstm_resnet_model.infer_from_features(torch.stack(sequences))
+
+    return split_scores(scores, [len(expanded_boxes) for _, _, expanded_boxes in requests])
+
+
+def split_scores(scores, counts):
+    """
+    Split a flat list of scores into consecutive chunks of the given sizes.
+    """
+    chunks = []
+    start = 0
+    for count in counts:
+        chunks.append(list(scores[start:start + count]))
+        start += count
+    return chunks
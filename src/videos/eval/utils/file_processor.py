@@ -1,11 +1,21 @@
 import os
+import logging
 import cv2
-from datetime import datetime, timedelta, time
+from collections import deque
+from time import perf_counter
 from tqdm import tqdm
 from .ignition_time import get_ignition_time
-from .analysis import calculate_detection_metrics, save_metrics_as_txt, plot_metrics
-from models.model_loader import load_model
-import uuid 
+from .analysis import build_detection_data, calculate_detection_metrics, save_metrics_as_txt, plot_metrics
+from .feature_cache import FeatureCache, classify_with_cache, split_scores
+from .timing import StageTimer
+from .folder_index import to_epoch
+from .frame_source import CLASSIFIER_INPUT_SIZE, ImageFolderSource, crop_frame, detector_box, detector_input, full_resolution
+from .motion_gate import MotionGate
+from .tracker import BoxTracker
+from .prefetch import Prefetcher
+from .artifact_writer import ArtifactWriter
+
+logger = logging.getLogger(__name__)
 
 DATE_TIME_LEN = 19
 
@@ -28,178 +38,346 @@ def is_bounding_box_large_enough(x1, y1, x2, y2, min_width=20, min_height=20, ma
 
     return min_width <= width <= max_width and min_height <= height <= max_height
 
-def crop_previous_frames(image_paths, bounding_box, temp_dir):
-    cropped_images_paths = []
-    for image_path in image_paths:
-        image = cv2.imread(image_path)
-        if image is None:
-            continue
-        x1, y1, x2, y2 = bounding_box
-        cropped_image = image[y1:y2, x1:x2]  
-
-        temp_image_path = os.path.join(temp_dir, f"{uuid.uuid4()}.jpg")
-        cv2.imwrite(temp_image_path, cropped_image) 
-        cropped_images_paths.append(temp_image_path)
-    return cropped_images_paths
-
-def process_files_in_folder(folder_path, output_folder, yolo_model, lstm_resnet_model, ignition_times, confidence_threshold, frames_back):
-    folder_name = os.path.basename(folder_path)
-    ignition_time = get_ignition_time(folder_name, ignition_times)
+def crop_previous_frames(frames, bounding_box):
+    # FireClassifier expects RGB crops, OpenCV decodes to BGR
+    return [cv2.cvtColor(crop_frame(frame, bounding_box), cv2.COLOR_BGR2RGB) for frame in frames]
+
+def detect_in_batches(source, yolo_model, confidence_threshold, batch_size=1, timer=None, motion_gate=None):
+    """
+    Run YOLO over (frame name, timestamp, image) frames from a frame source,
+    batch_size frames per call, yielding (frame name, timestamp, image, result).
+
+    With a MotionGate, frames it finds static skip YOLO and reuse the result
+    of the previous frame.
+    """
+    timer = timer or StageTimer()
+    frames = iter(source)
+    last_result = None
+    while True:
+        batch = []
+        while len(batch) < batch_size:
+            decode_start = perf_counter()
+            frame = next(frames, None)
+            if frame is None:
+                break
+            timer.add('decode', perf_counter() - decode_start)
+            batch.append(frame)
+        if not batch:
+            return
+
+        static = [False] * len(batch)
+        if motion_gate is not None:
+            # The gate never marks its first frame static, so there is always a result to reuse
+            with timer.stage('gate'):
+                static = [motion_gate.is_static(detector_input(image)) for _, _, image in batch]
+        detect_images = [detector_input(image) for (_, _, image), gated in zip(batch, static) if not gated]
+        results = []
+        if detect_images:
+            with timer.stage('yolo'):
+                results = yolo_model(detect_images, verbose=False, conf=confidence_threshold)
+        results = iter(results)
+        for (name, timestamp, image), gated in zip(batch, static):
+            if not gated:
+                last_result = next(results)
+            yield name, timestamp, image, last_result
+
+class SequenceDetector:
+    """
+    Per-camera state of the YOLO + FireClassifier pipeline.
+
+    Holds the look-back frames and the feature cache so frames can be fed one
+    at a time, in timestamp order, from a folder or from a live camera feed.
+    """
+
+    def __init__(self, lstm_resnet_model, frames_back, feature_cache_size=512, timer=None,
+                 confidence_threshold=0.0, lstm_threshold=0.5, track_reverify_every=0,
+                 track_max_drift=0.1, track_max_growth=0.2):
+        self.lstm_resnet_model = lstm_resnet_model
+        self.frames_back = frames_back
+        self.timer = timer or StageTimer()
+        # YOLO may run below confidence_threshold to log raw scores; decisions still use it
+        self.confidence_threshold = confidence_threshold
+        self.lstm_threshold = lstm_threshold
+        # (frame_idx, decoded frame) pairs shared by YOLO and the look-back crops, newest last
+        self.frame_buffer = deque(maxlen=frames_back + 1 if lstm_resnet_model else 1)
+        if lstm_resnet_model and feature_cache_size and feature_cache_size < frames_back + 1:
+            raise ValueError(f"feature_cache_size must be 0 (disabled) or at least frames_back + 1 = {frames_back + 1}, not {feature_cache_size}")
+        self.feature_cache = FeatureCache(frames_back, feature_cache_size) if lstm_resnet_model and feature_cache_size else None
+        # [x1, y1, x2, y2, yolo confidence, classifier score or None] for every box of the last frame
+        self.raw_boxes = []
+        # Tracked boxes reuse their last classifier score for up to track_reverify_every frames
+        self.tracker = BoxTracker(track_reverify_every, max_drift=track_max_drift, max_growth=track_max_growth) \
+            if lstm_resnet_model and track_reverify_every and track_reverify_every > 1 else None
+        # Scores reused from tracks and the tracks awaiting a score, for the current frame
+        self.reused_scores = {}
+        self.verify_tracks = []
+
+    def update(self, frame_idx, image, result):
+        """
+        Add a decoded frame and its YOLO result, and return the boxes confirmed
+        as smoke (every YOLO box above the threshold when no temporal model is configured).
+        """
+        boxes, confidences = self.observe(frame_idx, image, result)
+        scores = self.classify(frame_idx, image, boxes) if self.lstm_resnet_model is not None else [None] * len(boxes)
+        return self.decide(boxes, confidences, scores)
+
+    def observe(self, frame_idx, image, result):
+        """
+        Buffer the frame and return its YOLO boxes and confidences.
+        """
+        self.frame_buffer.append((frame_idx, image))
+        if self.feature_cache is not None:
+            self.feature_cache.evict_before(frame_idx)
+
+        # Boxes of a reduced-resolution decode are mapped back to full-resolution pixels
+        boxes = [detector_box(image, box) for box in result.boxes.xyxy]
+        confidences = [float(conf) for conf in result.boxes.conf]
+        return boxes, confidences
+
+    def decide(self, boxes, confidences, scores):
+        """
+        Record the frame's raw boxes and return those confirmed as smoke.
+        """
+        self.raw_boxes = [[*box, conf, score] for box, conf, score in zip(boxes, confidences, scores)]
+
+        positive_boxes = []
+        for box, conf, score in zip(boxes, confidences, scores):
+            if conf <= self.confidence_threshold:
+                continue
+            if self.lstm_resnet_model is None or (score is not None and score > self.lstm_threshold):
+                positive_boxes.append(box)
+        return positive_boxes
+
+    def verification_candidates(self, image, boxes):
+        """
+        Return the indices and expanded crop boxes of the boxes to classify:
+        none while the look-back window is not full yet, and never boxes that
+        are too small or too large. With a tracker, boxes whose track score can
+        be reused are left out; assign_scores fills them in.
+        """
+        self.reused_scores = {}
+        self.verify_tracks = []
+        if len(self.frame_buffer) < self.frames_back + 1:
+            return [], []
 
-    file_list = sorted(
-        [f for f in os.listdir(folder_path) if f.endswith('.jpg')],
-        key=lambda filename: datetime.strptime(filename[-(DATE_TIME_LEN+4):-4], '%Y_%m_%dT%H_%M_%S')
-    )
+        img_height, img_width = image.shape[:2]
+        candidate_indices = []
+        candidate_expanded_boxes = []
+        for i, (x1, y1, x2, y2) in enumerate(boxes):
+            if not is_bounding_box_large_enough(x1, y1, x2, y2):
+                continue
+            candidate_indices.append(i)
+            candidate_expanded_boxes.append(expand_bounding_box(x1, y1, x2, y2, img_width, img_height))
+
+        if self.tracker is not None:
+            tracks = self.tracker.match([boxes[i] for i in candidate_indices])
+            verify = []
+            for i, expanded_box, track in zip(candidate_indices, candidate_expanded_boxes, tracks):
+                if self.tracker.reusable(track):
+                    self.reused_scores[i] = track.score
+                    self.tracker.reused += 1
+                else:
+                    verify.append((i, expanded_box))
+                    self.verify_tracks.append(track)
+            self.tracker.verified += len(verify)
+            candidate_indices = [i for i, _ in verify]
+            candidate_expanded_boxes = [expanded_box for _, expanded_box in verify]
+        return candidate_indices, candidate_expanded_boxes
+
+    def classify(self, frame_idx, image, boxes):
+        """
+        Return the classifier score of each box, None for boxes that are too
+        small or too large, or while the look-back window is not full yet.
+        """
+        candidate_indices, candidate_expanded_boxes = self.verification_candidates(image, boxes)
+        global_predictions = []
+        if candidate_indices:
+            # All candidate boxes of the frame go through the classifier in one batch
+            global_predictions = verify_sequences(self.lstm_resnet_model, [(self, candidate_expanded_boxes)], self.timer)[0]
+        return self.assign_scores(frame_idx, len(boxes), candidate_indices, global_predictions)
+
+    def assign_scores(self, frame_idx, num_boxes, candidate_indices, global_predictions):
+        """
+        Combine fresh classifier scores with the scores reused from tracks.
+        """
+        scores = [None] * num_boxes
+        for i, score in self.reused_scores.items():
+            scores[i] = score
+        for i, global_prediction in zip(candidate_indices, global_predictions):
+            logger.debug(f"Global prediction for frame {frame_idx}: {global_prediction}")
+            scores[i] = global_prediction
+        for track, global_prediction in zip(self.verify_tracks, global_predictions):
+            self.tracker.record(track, global_prediction)
+        return scores
+
+def verify_sequences(lstm_resnet_model, requests, timer=None):
+    """
+    Score the look-back sequences of one or more detectors (cameras) with a
+    single backbone and LSTM call.
+
+    Args:
+        requests: (SequenceDetector, expanded_boxes) pairs with non-empty box lists.
+
+    Returns:
+        One list of scores per request.
+    """
+    timer = timer or StageTimer()
+    if all(detector.feature_cache is not None for detector, _ in requests):
+        return classify_with_cache(
+            lstm_resnet_model,
+            [(detector.feature_cache, detector.frame_buffer, expanded_boxes) for detector, expanded_boxes in requests],
+            crop_previous_frames, timer
+        )
+
+    with timer.stage('crop'):
+        sequences = []
+        for detector, expanded_boxes in requests:
+            frames = [frame for _, frame in detector.frame_buffer]
+            sequences.extend(crop_previous_frames(frames, box) for box in expanded_boxes)
+    with timer.stage('classifier'):
+        global_predictions = lstm_resnet_model.infer_batch(sequences)
+    return split_scores(global_predictions, [len(expanded_boxes) for _, expanded_boxes in requests])
+
+def draw_boxes(image, boxes):
+    # Draw on a copy so the buffered frame stays clean for later crops
+    annotated_image = full_resolution(image).copy()
+    for x1, y1, x2, y2 in boxes:
+        cv2.rectangle(annotated_image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+    return annotated_image
+
+def process_files_in_folder(folder_path, output_folder, yolo_model, lstm_resnet_model, ignition_times, confidence_threshold, frames_back, yolo_batch_size=1, feature_cache_size=512, timer=None, frames=None, writer=None, lstm_threshold=0.5, raw_score_floor=None, source=None, motion_threshold=None, motion_max_skip=10,
+                            track_reverify_every=0, track_max_drift=0.1, track_max_growth=0.2,
+                            decode_scale=1, min_crop_side=CLASSIFIER_INPUT_SIZE, prefetch_frames=0, prefetch_workers=2):
+    # source: any frame source (a video file, ...); defaults to the folder's JPEGs
+    source = source or ImageFolderSource(folder_path, frames, decode_scale, min_crop_side)
+    folder_name = source.name
+    ignition_time = get_ignition_time(folder_name, ignition_times)
 
-    print(f"Processing folder: {folder_path}")
-    print(f"Number of files: {len(file_list)}")
+    logger.info(f"Processing folder: {folder_path}")
+    logger.info(f"Number of files: {len(source)}")
 
-    if not file_list:
+    if isinstance(source, ImageFolderSource) and not len(source):
         return None
 
-    first_filename = file_list[0]
-    date_time_str = first_filename[-(DATE_TIME_LEN+4):-4]
+    # Upcoming frames are decoded in the background while the current one is in inference
+    prefetcher = Prefetcher(source, prefetch_frames, prefetch_workers) if prefetch_frames else None
+    source = prefetcher or source
 
-    detection_data = {
-        "folder_name": folder_name,
-        "before_ignition_not_detected": 0,
-        "before_ignition_detected": 0,
-        "after_ignition_not_detected": 0,
-        "after_ignition_detected": 0,
-        "detection_delay": None,
-        "total_frames": len(file_list),
-        "bounding_boxes": [],
-        "frame_predictions": []
-    }
+    # Run YOLO down to the raw-score floor so offline sweeps can try lower thresholds
+    yolo_conf = confidence_threshold if raw_score_floor is None else min(raw_score_floor, confidence_threshold)
+
+    bounding_boxes = []
+    frame_times = []
+    detected_flags = []
+    raw_boxes = []
 
-    detected_after_ignition = False
+    # Without a shared writer the folder gets its own, closed before returning
+    owns_writer = writer is None
+    writer = writer or ArtifactWriter()
 
     detections_folder = os.path.join(output_folder, 'detections')
     results_folder = os.path.join(output_folder, 'results')
     zoom_folder = os.path.join(output_folder, 'data/buffer')
-    temp_crop_folder = os.path.join(output_folder, 'temp_crops')
-    os.makedirs(detections_folder, exist_ok=True)
-    os.makedirs(results_folder, exist_ok=True)
-    os.makedirs(zoom_folder, exist_ok=True)
-    os.makedirs(temp_crop_folder, exist_ok=True)
-
-    def clear_buffer_folder(folder_path):
-        for f in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, f)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
-
-    for frame_idx, filename in enumerate(tqdm(file_list, desc=f"Processing images in {folder_name}")):
-        current_time = datetime.strptime(filename[-(DATE_TIME_LEN+4):-4], '%Y_%m_%dT%H_%M_%S')
+    if writer.enabled:
+        os.makedirs(detections_folder, exist_ok=True)
+        os.makedirs(results_folder, exist_ok=True)
+        os.makedirs(zoom_folder, exist_ok=True)
+
+    timer = timer or StageTimer()
+    folder_start = perf_counter()
+    frame_end = folder_start
+    detector = SequenceDetector(
+        lstm_resnet_model, frames_back, feature_cache_size, timer,
+        confidence_threshold=confidence_threshold, lstm_threshold=lstm_threshold,
+        track_reverify_every=track_reverify_every, track_max_drift=track_max_drift, track_max_growth=track_max_growth
+    )
+
+    # Optional change detection that lets static frames skip YOLO
+    motion_gate = MotionGate(motion_threshold, max_skip=motion_max_skip) if motion_threshold is not None else None
+    detections = detect_in_batches(source, yolo_model, yolo_conf, yolo_batch_size, timer, motion_gate)
+    for frame_idx, (filename, frame_time, image, result) in enumerate(tqdm(detections, total=len(source), desc=f"Processing images in {folder_name}")):
         file_path = os.path.join(folder_path, filename)
-        print(f"Processing image: {file_path}")
-        image = cv2.imread(file_path)
-        print(f"Image shape: {image.shape}")
-        img_height, img_width = image.shape[:2]
-        results = yolo_model(file_path, verbose=False, conf=confidence_threshold)
-        num_boxes = len(results[0].boxes)
-        print(f"Número de bounding boxes detectados: {num_boxes}")
-
-        detected = False 
-
-        if num_boxes > 0 and lstm_resnet_model:
-            boxes = results[0].boxes.xyxy
-            confidences = results[0].boxes.conf
-
-            for i in range(num_boxes):
-                x1, y1, x2, y2 = map(int, boxes[i])
-
-                if not is_bounding_box_large_enough(x1, y1, x2, y2):
-                    continue
-
-                expanded_box = expand_bounding_box(x1, y1, x2, y2, img_width, img_height)
-
-                previous_images = file_list[max(0, frame_idx - frames_back):frame_idx]
-                previous_image_paths = [os.path.join(folder_path, f) for f in previous_images]
-                previous_image_paths.append(file_path)
-
-                cropped_images_paths = crop_previous_frames(previous_image_paths, expanded_box, temp_crop_folder)
-                if len(cropped_images_paths) == frames_back+1:
-                    global_prediction = lstm_resnet_model.infer_5_frames(cropped_images_paths)
-                    print(f"Global prediction for frame {frame_idx}: {global_prediction}")
-                    if global_prediction > 0.5:
-                        cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                        detected = True 
-                        output_image_path = os.path.join(detections_folder, filename)
-                        cv2.imwrite(output_image_path, image)
-                        print(f"Frame index: {frame_idx}, Image name: {filename}, Detected: {detected}")
-        
-        elif num_boxes > 0 and lstm_resnet_model is None:
-            boxes = results[0].boxes.xyxy
-            detection_data["bounding_boxes"].append([int(x) for box in boxes for x in box])
-
-            detected = True
-
-            for i in range(num_boxes):
-                x1, y1, x2, y2 = map(int, boxes[i])
-                cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
-
-            output_image_path = os.path.join(detections_folder, filename)
-            cv2.imwrite(output_image_path, image)
-
-        
-        print(f"Frame index: {frame_idx}, Image name: {filename}, Detected: {detected}")
-
-        if ignition_time is None:
-            ignition_time = datetime.max.time()
-            ignition_time = datetime.combine(datetime.max.date(), ignition_time)
-            print("NO WILDFIRE")
-
-        print(f"Current time: {current_time}, Ignition time: {ignition_time}")
-        
-        if current_time < ignition_time:
-            if detected:
-                detection_data["before_ignition_detected"] += 1
-                detection_data["frame_predictions"].append(-1)
-            else:
-                detection_data["before_ignition_not_detected"] += 1
-                detection_data["frame_predictions"].append(1)
-
-        elif current_time == ignition_time:
-            print("*-"*30)
-            if 0 not in detection_data["frame_predictions"]:
-                detection_data["frame_predictions"].append(0)
-                print("Ignition frame detected")
-            if detected:
-                detection_data["after_ignition_detected"] += 1
-                detection_data["frame_predictions"].append(1)
-                print("Ignition frame detected correctly")
-            else:
-                detection_data["after_ignition_not_detected"] += 1
-                detection_data["frame_predictions"].append(-1)
-
-        else:
-            if detected:
-                detection_data["after_ignition_detected"] += 1
-                detection_data["frame_predictions"].append(1)
-            else:
-                detection_data["after_ignition_not_detected"] += 1
-                detection_data["frame_predictions"].append(-1)
-        if current_time == ignition_time and not detected_after_ignition:
-            detected_after_ignition = True
-
-        if detected_after_ignition and detected and detection_data["detection_delay"] is None:
-            print(f"Detection time: {current_time}")
-            print(f"Ignition time: {ignition_time}")
-            d_delay = current_time - ignition_time
-            print(f"Detection delay: {d_delay}")
-            d_delay = timedelta(hours=d_delay.seconds // 3600, minutes=(d_delay.seconds // 60) % 60)
-            print(f"Detection delay: {d_delay}")
-            d_delay = d_delay.total_seconds()
-            print(f"Detection delay: {d_delay}")
-            d_delay = int(d_delay) // 60
-            print(f"Detection delay: {d_delay}")
-            detection_data["detection_delay"] = d_delay
-
-    clear_buffer_folder(temp_crop_folder)
-
-    metrics = calculate_detection_metrics(detection_data)
-    save_metrics_as_txt(metrics, results_folder)
-    plot_metrics(metrics, results_folder)
+        logger.debug(f"Processing image: {file_path}")
+        frame_times.append(frame_time)
+        logger.debug(f"Image shape: {image.shape}")
+        logger.debug(f"Número de bounding boxes detectados: {len(result.boxes)}")
+
+        positive_boxes = detector.update(frame_idx, image, result)
+        detected = bool(positive_boxes)
+        detected_flags.append(detected)
+        raw_boxes.append(detector.raw_boxes)
+
+        if detected:
+            if lstm_resnet_model is None:
+                bounding_boxes.append([x for box in positive_boxes for x in box])
+            if writer.enabled:
+                # One annotated image per frame with every confirmed box, encoded in the background;
+                # the stage only covers drawing and queueing, not the JPEG write
+                with timer.stage('annotation_enqueue'):
+                    output_image_path = os.path.join(detections_folder, filename)
+                    writer.write_image(output_image_path, draw_boxes(image, positive_boxes))
+
+        logger.debug(f"Frame index: {frame_idx}, Image name: {filename}, Detected: {detected}")
+
+        # Wall time per frame, including its share of batched decode and YOLO
+        timer.add('frame', perf_counter() - frame_end)
+        frame_end = perf_counter()
+
+    if not frame_times:
+        logger.warning(f"No frames decoded from {folder_path}")
+        if owns_writer:
+            writer.close()
+        return None
+
+    if prefetcher is not None:
+        prefetch = prefetcher.stats()
+        logger.info(
+            f"Prefetch: {prefetch['frames_per_second'] or 0:.2f} frames/s, mean {prefetch['mean_ready']:.2f} of "
+            f"{prefetch['depth']} frames ready, waited {prefetch['wait_seconds']:.2f} s for decode"
+        )
+
+    if motion_gate is not None:
+        logger.info(f"Motion gate: YOLO skipped on {motion_gate.gated} of {motion_gate.frames} frames")
+
+    if detector.tracker is not None:
+        logger.info(
+            f"Tracker: {detector.tracker.reused} classifier scores reused, {detector.tracker.verified} verified "
+            f"({detector.tracker.reuse_rate():.1%} reuse)"
+        )
+
+    if detector.feature_cache is not None:
+        logger.info(f"Feature cache: {detector.feature_cache.hits} hits, {detector.feature_cache.misses} misses")
+
+    if ignition_time is None:
+        logger.info(f"NO WILDFIRE in {folder_name}")
+
+    detection_data = build_detection_data(folder_name, frame_times, ignition_time, detected_flags)
+    detection_data["bounding_boxes"] = bounding_boxes
+    detection_data["gated_frames"] = motion_gate.gated if motion_gate is not None else 0
+    detection_data["prefetch"] = prefetcher.stats() if prefetcher is not None else None
+    detection_data["reused_verifications"] = detector.tracker.reused if detector.tracker is not None else 0
+    detection_data["verifications"] = detector.tracker.verified if detector.tracker is not None else None
+    if detection_data["detection_delay"] is not None:
+        logger.info(f"Detection delay in {folder_name}: {detection_data['detection_delay']}")
+    detection_data["raw_scores"] = {
+        "folder_name": folder_name,
+        "frame_times": [to_epoch(t) for t in frame_times],
+        "ignition_time": to_epoch(ignition_time) if ignition_time is not None else None,
+        "yolo_conf": yolo_conf,
+        "has_classifier": lstm_resnet_model is not None,
+        "boxes": raw_boxes,
+    }
+
+    # Covers computing the metrics and queueing results.txt and the plots, not writing them
+    with timer.stage('metrics_enqueue'):
+        metrics = calculate_detection_metrics(detection_data)
+        writer.submit(save_metrics_as_txt, metrics, results_folder)
+        writer.submit(plot_metrics, metrics, results_folder)
+
+    if owns_writer:
+        writer.close()
+
+    timer.add('folder', perf_counter() - folder_start)
+    detection_data["timings"] = timer.to_dict()
 
     return detection_data
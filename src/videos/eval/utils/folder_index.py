@@ -0,0 +1,105 @@
+import os
+import json
+import logging
+from datetime import datetime, timedelta
+from .ignition_time import load_ignition_times
+
+logger = logging.getLogger(__name__)
+
+DATE_TIME_LEN = 19
+DATE_TIME_FORMAT = '%Y_%m_%dT%H_%M_%S'
+INDEX_VERSION = 1
+EPOCH = datetime(1970, 1, 1)
+
+def parse_frame_time(filename):
+    return datetime.strptime(filename[-(DATE_TIME_LEN+4):-4], DATE_TIME_FORMAT)
+
+def to_epoch(timestamp):
+    """
+    Seconds since 1970 as a float; microseconds survive the round trip through from_epoch.
+    """
+    return (timestamp - EPOCH).total_seconds()
+
+def from_epoch(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+def scan_folder(folder_path, known_epochs=None):
+    """
+    Return the folder's .jpg frames as (filename, epoch seconds) sorted by time,
+    parsing only filenames missing from known_epochs.
+    """
+    known_epochs = known_epochs or {}
+    frames = []
+    for filename in os.listdir(folder_path):
+        if not filename.endswith('.jpg'):
+            continue
+        epoch = known_epochs.get(filename)
+        if epoch is None:
+            epoch = to_epoch(parse_frame_time(filename))
+        frames.append((filename, epoch))
+    frames.sort(key=lambda frame: (frame[1], frame[0]))
+    return frames
+
+class FolderIndex:
+    """
+    Persistent index of every evaluated folder's sorted frames with parsed
+    timestamps, plus the ignition times keyed by folder name.
+
+    Entries are refreshed only when the folder (or ignition file) mtime changes,
+    and only new filenames are parsed, so large archives start immediately.
+    """
+
+    def __init__(self, index_path=None):
+        self.index_path = index_path
+        self.data = {"version": INDEX_VERSION, "folders": {}, "ignition": None}
+        self.dirty = False
+        if index_path and os.path.isfile(index_path):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == INDEX_VERSION:
+                    self.data = data
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable folder index {index_path}: {e}")
+
+    def frames(self, folder_path):
+        """
+        Return [(filename, datetime)] for folder_path, sorted by timestamp.
+        """
+        key = os.path.abspath(folder_path)
+        mtime = os.stat(folder_path).st_mtime_ns
+        entry = self.data["folders"].get(key)
+        if entry is None or entry["mtime"] != mtime:
+            known_epochs = dict(entry["frames"]) if entry else None
+            entry = {"mtime": mtime, "frames": scan_folder(folder_path, known_epochs)}
+            self.data["folders"][key] = entry
+            self.dirty = True
+        return [(filename, from_epoch(epoch)) for filename, epoch in entry["frames"]]
+
+    def ignition_times(self, ignition_time_path):
+        """
+        Return {folder name: ignition datetime} for the ignition JSON file.
+        """
+        key = os.path.abspath(ignition_time_path)
+        mtime = os.stat(ignition_time_path).st_mtime_ns
+        entry = self.data.get("ignition")
+        if entry is None or entry["path"] != key or entry["mtime"] != mtime:
+            times = {}
+            for item in load_ignition_times(ignition_time_path):
+                # Keep the first entry per folder, as the linear lookup did
+                times.setdefault(item['folder'], to_epoch(datetime.strptime(item['ignition_time'], '%Y-%m-%d %H:%M:%S')))
+            entry = {"path": key, "mtime": mtime, "times": times}
+            self.data["ignition"] = entry
+            self.dirty = True
+        return {folder: from_epoch(epoch) for folder, epoch in entry["times"].items()}
+
+    def save(self):
+        if not self.index_path or not self.dirty:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f)
+        os.replace(tmp_path, self.index_path)
+        self.dirty = False
+        logger.info(f"Folder index saved to {self.index_path}")
@@ -0,0 +1,269 @@
+import os
+import logging
+from functools import partial
+from datetime import datetime, timedelta
+import cv2
+from PIL import Image
+from .folder_index import DATE_TIME_FORMAT, scan_folder, from_epoch, parse_frame_time
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# JPEG DCT-domain downscaling: libjpeg decodes directly at 1/2, 1/4 or 1/8 size
+REDUCED_DECODE_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+# FireClassifier resizes every crop to this size
+CLASSIFIER_INPUT_SIZE = 224
+# EXIF orientations that rotate the image by 90 degrees, swapping width and height
+EXIF_ORIENTATION_TAG = 0x0112
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+def is_video_file(path):
+    return os.path.isfile(path) and path.lower().endswith(VIDEO_EXTENSIONS)
+
+def video_name(video_path):
+    return os.path.splitext(os.path.basename(video_path))[0]
+
+def sidecar_path(video_path):
+    return f"{os.path.splitext(video_path)[0]}.timestamps.txt"
+
+def parse_timestamp(value):
+    """
+    Parse 'YYYY-MM-DD HH:MM:SS[.ffffff]' or the frame-filename format.
+    """
+    value = value.strip()
+    for fmt in (TIMESTAMP_FORMAT, f"{TIMESTAMP_FORMAT}.%f", DATE_TIME_FORMAT):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized timestamp: {value!r}")
+
+def list_video_folders(main_path, video_folder):
+    """
+    Return (folder_path, folder_name) pairs to evaluate, in processing order.
+    Video files are evaluated like frame folders, named after the file.
+
+    Results, artifacts and ignition times are keyed by folder name, so when
+    several folders (or a folder and a video file) share a name only the
+    first one found is kept and the others are skipped with a warning.
+    """
+    if video_folder:
+        folder_path = os.path.join(main_path, video_folder)
+        return [(folder_path, video_name(folder_path) if is_video_file(folder_path) else video_folder)]
+
+    folders = []
+    for root, dirs, files in os.walk(main_path):
+        # Sorted so the folder kept among duplicates does not depend on the file system
+        dirs.sort()
+        for dir_name in dirs:
+            if "labels" in dir_name.lower():
+                logger.info(f"Ignoring folder: {dir_name}")
+                continue
+            folders.append((os.path.join(root, dir_name), dir_name))
+        for file_name in sorted(files):
+            if file_name.lower().endswith(VIDEO_EXTENSIONS):
+                folders.append((os.path.join(root, file_name), video_name(file_name)))
+
+    kept = {}
+    for folder_path, folder_name in folders:
+        if folder_name in kept:
+            logger.warning(f"Skipping {folder_path}: its name {folder_name!r} is already used by {kept[folder_name]}")
+            continue
+        kept[folder_name] = folder_path
+    return [(folder_path, folder_name) for folder_name, folder_path in kept.items()]
+
+class ReducedFrame:
+    """
+    A JPEG frame decoded at 1/scale resolution for the detector.
+
+    shape reports the full-resolution size (read from the JPEG header, with the
+    EXIF orientation OpenCV applies) so box coordinates stay in full-resolution
+    pixels. libjpeg rounds reduced sizes up, so the factor between the two
+    images is computed per axis rather than taken as scale. Crops come from the reduced
+    image when it still yields at least min_crop_side pixels per side;
+    otherwise the full frame is decoded once, on first use, and kept.
+    """
+
+    def __init__(self, path, scale, min_crop_side=CLASSIFIER_INPUT_SIZE):
+        self.path = path
+        self.scale = scale
+        self.min_crop_side = min_crop_side
+        self.image = cv2.imread(path, REDUCED_DECODE_FLAGS[scale])
+        with Image.open(path) as header:
+            width, height = header.size
+            if header.getexif().get(EXIF_ORIENTATION_TAG) in TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+        self.shape = (height, width, 3)
+        reduced_height, reduced_width = self.image.shape[:2]
+        self.scale_x = width / reduced_width
+        self.scale_y = height / reduced_height
+        self._full_image = None
+
+    def full_image(self):
+        if self._full_image is None:
+            self._full_image = cv2.imread(self.path)
+        return self._full_image
+
+    def full_resolution_box(self, box):
+        """
+        Map a box on the reduced image to full-resolution pixels, clipped to the frame.
+        """
+        height, width = self.shape[:2]
+        x1, y1, x2, y2 = (float(v) for v in box)
+        return (
+            min(max(int(x1 * self.scale_x), 0), width),
+            min(max(int(y1 * self.scale_y), 0), height),
+            min(max(int(x2 * self.scale_x), 0), width),
+            min(max(int(y2 * self.scale_y), 0), height),
+        )
+
+    def crop(self, box):
+        """
+        Return the BGR pixels of a full-resolution box.
+        """
+        x1, y1, x2, y2 = box
+        rx1, rx2 = int(x1 / self.scale_x), int(x2 / self.scale_x)
+        ry1, ry2 = int(y1 / self.scale_y), int(y2 / self.scale_y)
+        if rx2 - rx1 >= self.min_crop_side and ry2 - ry1 >= self.min_crop_side:
+            return self.image[ry1:ry2, rx1:rx2]
+        return self.full_image()[y1:y2, x1:x2]
+
+def detector_input(image):
+    """
+    The pixels the detector (and motion gate) should see for a decoded frame.
+    """
+    return image.image if isinstance(image, ReducedFrame) else image
+
+def detector_box(image, box):
+    """
+    Integer full-resolution pixel box of a detection on detector_input(image).
+    """
+    if isinstance(image, ReducedFrame):
+        return image.full_resolution_box(box)
+    return tuple(int(float(v)) for v in box)
+
+def full_resolution(image):
+    return image.full_image() if isinstance(image, ReducedFrame) else image
+
+def crop_frame(image, box):
+    if isinstance(image, ReducedFrame):
+        return image.crop(box)
+    x1, y1, x2, y2 = box
+    return image[y1:y2, x1:x2]
+
+class ImageFolderSource:
+    """
+    Frames of a folder of timestamped JPEGs, in timestamp order.
+
+    Iterating yields (frame name, datetime, BGR image); images are decoded lazily.
+    With decode_scale 2, 4 or 8 frames are ReducedFrames decoded at that
+    fraction of their resolution.
+    """
+
+    def __init__(self, folder_path, frames=None, decode_scale=1, min_crop_side=CLASSIFIER_INPUT_SIZE):
+        if decode_scale != 1 and decode_scale not in REDUCED_DECODE_FLAGS:
+            raise ValueError(f"decode_scale must be 1, 2, 4 or 8, not {decode_scale}")
+        self.decode_scale = decode_scale
+        self.min_crop_side = min_crop_side
+        self.folder_path = folder_path
+        self.name = os.path.basename(folder_path)
+        # frames: sorted (filename, datetime) pairs, e.g. from a FolderIndex
+        if frames is None:
+            frames = [(filename, from_epoch(epoch)) for filename, epoch in scan_folder(folder_path)]
+        self.frames = frames
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        for filename, timestamp in self.frames:
+            yield self.load(filename, timestamp)
+
+    def load(self, filename, timestamp):
+        path = os.path.join(self.folder_path, filename)
+        if self.decode_scale == 1:
+            return filename, timestamp, cv2.imread(path)
+        return filename, timestamp, ReducedFrame(path, self.decode_scale, self.min_crop_side)
+
+    def frame_loaders(self):
+        """
+        One independent callable per frame, in order, so frames can be decoded in parallel.
+        """
+        return [partial(self.load, filename, timestamp) for filename, timestamp in self.frames]
+
+class VideoFileSource:
+    """
+    Frames streamed from a video file with OpenCV, never written to disk.
+
+    Timestamps come from a sidecar file next to the video (clip.timestamps.txt,
+    one timestamp per decoded frame) if present, otherwise from start_time plus
+    frame index / fps. start_time defaults to a '_YYYY_MM_DDTHH_MM_SS' suffix in
+    the file name and fps to the container's frame rate. With frame_step > 1
+    only every frame_step-th frame is decoded; the others are skipped with
+    grab(), which does not convert them to images.
+    """
+
+    def __init__(self, video_path, start_time=None, fps=None, timestamps_path=None, frame_step=1):
+        self.video_path = video_path
+        self.name = video_name(video_path)
+        self.frame_step = max(1, frame_step)
+
+        capture = cv2.VideoCapture(video_path)
+        if not capture.isOpened():
+            raise IOError(f"Could not open video {video_path}")
+        self.fps = fps or capture.get(cv2.CAP_PROP_FPS)
+        # Containers may not report a frame count; it is only used for progress and logging
+        self.frame_count = max(0, int(capture.get(cv2.CAP_PROP_FRAME_COUNT)))
+        capture.release()
+
+        timestamps_path = timestamps_path or sidecar_path(video_path)
+        self.timestamps = None
+        if os.path.isfile(timestamps_path):
+            with open(timestamps_path, 'r', encoding='utf-8') as f:
+                self.timestamps = [parse_timestamp(line) for line in f if line.strip()]
+            logger.info(f"Using {len(self.timestamps)} timestamps from {timestamps_path}")
+        else:
+            if start_time is None:
+                try:
+                    start_time = parse_frame_time(os.path.basename(video_path))
+                except ValueError:
+                    raise ValueError(f"No start time for {video_path}: add {timestamps_path} or a _YYYY_MM_DDTHH_MM_SS suffix") from None
+            if not self.fps or self.fps <= 0:
+                raise ValueError(f"Unknown frame rate for {video_path}; set it explicitly")
+            self.start_time = start_time
+
+    def __len__(self):
+        frame_count = len(self.timestamps) if self.timestamps is not None else self.frame_count
+        return (frame_count + self.frame_step - 1) // self.frame_step
+
+    def timestamp(self, frame_number):
+        if self.timestamps is not None:
+            return self.timestamps[frame_number]
+        return self.start_time + timedelta(seconds=frame_number / self.fps)
+
+    def __iter__(self):
+        capture = cv2.VideoCapture(self.video_path)
+        try:
+            frame_number = 0
+            while True:
+                if self.timestamps is not None and frame_number >= len(self.timestamps):
+                    break
+                if frame_number % self.frame_step:
+                    if not capture.grab():
+                        break
+                    frame_number += 1
+                    continue
+                ok, image = capture.read()
+                if not ok:
+                    break
+                yield f"{self.name}_{frame_number:06d}.jpg", self.timestamp(frame_number), image
+                frame_number += 1
+            if self.timestamps is not None and frame_number < len(self.timestamps):
+                logger.warning(f"{self.video_path} ended after {frame_number} of {len(self.timestamps)} timestamped frames")
+        finally:
+            capture.release()
@@ -7,6 +7,9 @@ def load_ignition_times(ignition_time_path):
         return json.load(f)
 
 def get_ignition_time(folder_name, ignition_times):
+    # A {folder: datetime} dict, as built by FolderIndex, avoids the linear scan
+    if isinstance(ignition_times, dict):
+        return ignition_times.get(folder_name)
     for entry in ignition_times:
         if entry['folder'] == folder_name:
             return datetime.strptime(entry['ignition_time'], '%Y-%m-%d %H:%M:%S')
@@ -0,0 +1,148 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+import cv2
+from .file_processor import SequenceDetector, draw_boxes, DATE_TIME_LEN
+from .artifact_writer import ArtifactWriter
+from .scheduler import InferenceScheduler
+
+logger = logging.getLogger(__name__)
+
+def frame_timestamp(filename):
+    # 'YYYY_MM_DDTHH_MM_SS' sorts lexicographically in time order
+    return filename[-(DATE_TIME_LEN+4):-4]
+
+class CameraFeed:
+    """
+    A watched camera folder: its detector state and the timestamp of the last
+    frame handed out, so each frame is processed once and only look-back state
+    is kept in memory.
+    """
+
+    def __init__(self, folder_path, detector):
+        self.folder_path = folder_path
+        self.folder_name = os.path.basename(os.path.normpath(folder_path))
+        self.detector = detector
+        self.last_timestamp = None
+        self.frame_idx = 0
+        self.dropped_frames = 0
+
+    def poll(self, settle_seconds, max_backlog):
+        """
+        Return new, fully written frames ordered by timestamp. When more than
+        max_backlog frames are waiting, the oldest are dropped to keep latency bounded.
+        """
+        now = time.time()
+        pending = []
+        unsettled = []
+        for filename in os.listdir(self.folder_path):
+            if not filename.endswith('.jpg'):
+                continue
+            timestamp = frame_timestamp(filename)
+            if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+                continue
+            try:
+                datetime.strptime(timestamp, '%Y_%m_%dT%H_%M_%S')
+                modified = os.path.getmtime(os.path.join(self.folder_path, filename))
+            except (ValueError, FileNotFoundError):
+                continue
+            # Files modified very recently may still be being written
+            if now - modified < settle_seconds:
+                unsettled.append(timestamp)
+            else:
+                pending.append((timestamp, filename))
+
+        # Hold back anything newer than a frame still being written so order is preserved
+        if unsettled:
+            pending = [item for item in pending if item[0] < min(unsettled)]
+        pending.sort()
+        if len(pending) > max_backlog:
+            self.dropped_frames += len(pending) - max_backlog
+            logger.warning(f"[{self.folder_name}] Dropping {len(pending) - max_backlog} backlogged frames")
+            pending = pending[-max_backlog:]
+        if pending:
+            self.last_timestamp = pending[-1][0]
+        return [filename for _, filename in pending]
+
+    def read_frames(self, filenames):
+        """
+        Yield (filename, timestamp, image) for the given frames, skipping unreadable files.
+        """
+        for filename in filenames:
+            image = cv2.imread(os.path.join(self.folder_path, filename))
+            if image is None:
+                logger.warning(f"[{self.folder_name}] Could not read {filename}")
+                continue
+            yield filename, frame_timestamp(filename), image
+
+async def process_new_frames(feeds, scheduler, settle_seconds, max_backlog, on_frame):
+    """
+    Run every feed's new frames concurrently, so frames from different cameras
+    share detector and verifier batches.
+    """
+    async def run_feed(feed):
+        filenames = feed.poll(settle_seconds, max_backlog)
+        feed.frame_idx = await scheduler.run_stream(
+            feed.detector, feed.read_frames(filenames), feed.frame_idx,
+            lambda *frame: on_frame(feed, *frame)
+        )
+
+    await asyncio.gather(*(run_feed(feed) for feed in feeds))
+
+def watch_folders(folder_paths, yolo_model, lstm_resnet_model, config, output_folder=None,
+                  poll_interval=2.0, settle_seconds=1.0, max_polls=None):
+    """
+    Evaluate frames as they land in one or more camera folders.
+
+    Each new frame runs through YOLO and the temporal model once, using the
+    per-camera look-back state. Detections are reported with the per-frame
+    latency and, if output_folder is given, annotated frames are saved under
+    <output_folder>/<camera>/detections.
+    """
+    frames_back = config['frames_back']
+    confidence_threshold = config['confidence_threshold']
+    # A fresh feed (or one that fell behind) only needs enough frames to fill the look-back
+    max_backlog = config.get('max_backlog') or (frames_back + 1 if lstm_resnet_model else 1)
+
+    feeds = [
+        CameraFeed(folder_path, SequenceDetector(
+            lstm_resnet_model, frames_back, config.get('feature_cache_size', 512),
+            confidence_threshold=confidence_threshold, lstm_threshold=config.get('lstm_threshold', 0.5),
+            track_reverify_every=config.get('track_reverify_every', 0),
+            track_max_drift=config.get('track_max_drift', 0.1),
+            track_max_growth=config.get('track_max_growth', 0.2)
+        ))
+        for folder_path in folder_paths
+    ]
+    for feed in feeds:
+        logger.info(f"Watching folder: {feed.folder_path}")
+
+    # Annotated frames are encoded off the detection path to keep per-frame latency low
+    writer = ArtifactWriter(enabled=bool(output_folder) and config.get('save_artifacts', True))
+    # Cameras share the models; a batch waits at most max_batch_delay for other cameras' frames
+    scheduler = InferenceScheduler(
+        yolo_model, lstm_resnet_model, confidence_threshold,
+        config.get('max_batch_size') or len(feeds), config.get('max_batch_delay', 0.05)
+    )
+
+    def report(feed, filename, timestamp, image, positive_boxes, latency):
+        status = "SMOKE DETECTED" if positive_boxes else "no detection"
+        logger.info(f"[{feed.folder_name}] {filename}: {status} {positive_boxes} ({latency:.2f} s)")
+
+        if positive_boxes and writer.enabled:
+            detections_folder = os.path.join(output_folder, feed.folder_name, 'detections')
+            os.makedirs(detections_folder, exist_ok=True)
+            writer.write_image(os.path.join(detections_folder, filename), draw_boxes(image, positive_boxes))
+
+    polls = 0
+    try:
+        while max_polls is None or polls < max_polls:
+            polls += 1
+            asyncio.run(process_new_frames(feeds, scheduler, settle_seconds, max_backlog, report))
+            time.sleep(poll_interval)
+    finally:
+        scheduler.log_stats()
+        scheduler.close()
+        writer.close()
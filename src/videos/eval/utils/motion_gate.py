@@ -0,0 +1,54 @@
+import cv2
+import numpy as np
+
+class MotionGate:
+    """
+    Cheap change detector that decides whether a frame needs a detector run.
+
+    Frames are downscaled to `width` pixels wide, converted to grayscale and
+    compared with a running-average background. A frame is static when fewer
+    than `threshold` (a fraction of the downscaled pixels) differ from the
+    background by more than `pixel_delta` grey levels. The detector still runs
+    at least every `max_skip` frames, so slow changes that the background
+    absorbs cannot hide for long.
+    """
+
+    def __init__(self, threshold=0.002, pixel_delta=15, width=160, alpha=0.1, max_skip=10):
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.width = width
+        self.alpha = alpha
+        self.max_skip = max_skip
+        self.background = None
+        self.skipped_in_row = 0
+        self.frames = 0
+        self.gated = 0
+
+    def downscale(self, image):
+        height, width = image.shape[:2]
+        size = (self.width, max(1, round(height * self.width / width)))
+        small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        # Blur away JPEG noise so it does not count as change
+        return cv2.GaussianBlur(gray, (3, 3), 0).astype(np.float32)
+
+    def is_static(self, image):
+        """
+        Return True if the frame can reuse the previous detector result.
+        """
+        self.frames += 1
+        small = self.downscale(image)
+        if self.background is None or self.background.shape != small.shape:
+            self.background = small
+            self.skipped_in_row = 0
+            return False
+
+        changed = np.count_nonzero(np.abs(small - self.background) > self.pixel_delta) / small.size
+        cv2.accumulateWeighted(small, self.background, self.alpha)
+
+        if changed >= self.threshold or self.skipped_in_row >= self.max_skip:
+            self.skipped_in_row = 0
+            return False
+        self.skipped_in_row += 1
+        self.gated += 1
+        return True
@@ -0,0 +1,218 @@
+import os
+import json
+import numpy as np
+
+MANIFEST_FILE = 'manifest.json'
+FRAMES_FILE = 'frames.bin'
+BOXES_FILE = 'boxes.bin'
+STORE_VERSION = 2
+
+# One row per frame. state is +1/-1 as in frame_predictions; ignition_mark flags
+# the frame before which frame_predictions holds its 0 ignition marker.
+# Timestamps are epoch seconds: whole seconds in version 1 stores, floats
+# keeping sub-second video timestamps since version 2.
+FRAME_DTYPES = {
+    version: np.dtype([
+        ('folder_id', '<i4'),
+        ('frame_index', '<i4'),
+        ('timestamp', timestamp_type),
+        ('state', 'i1'),
+        ('ignition_mark', 'i1'),
+    ])
+    for version, timestamp_type in ((1, '<i8'), (2, '<f8'))
+}
+FRAME_DTYPE = FRAME_DTYPES[STORE_VERSION]
+
+# One row per raw YOLO box; score is NaN when the box was not classified.
+BOX_DTYPE = np.dtype([
+    ('folder_id', '<i4'),
+    ('frame_index', '<i4'),
+    ('x1', '<i4'),
+    ('y1', '<i4'),
+    ('x2', '<i4'),
+    ('y2', '<i4'),
+    ('yolo_conf', '<f4'),
+    ('score', '<f4'),
+])
+
+# Per-folder scalars kept in the manifest so summaries need no table reads
+SUMMARY_KEYS = [
+    "before_ignition_not_detected",
+    "before_ignition_detected",
+    "after_ignition_not_detected",
+    "after_ignition_detected",
+    "detection_delay",
+    "total_frames",
+    "gated_frames",
+    "reused_verifications",
+    "verifications",
+    "prefetch",
+    "timings",
+]
+
+class PredictionStore:
+    """
+    Columnar store of per-frame states and raw boxes for an evaluation.
+
+    Rows are appended to two flat binary tables (frames.bin, boxes.bin) one
+    folder at a time, and manifest.json records each folder's row range, so a
+    reader can memory-map the tables and slice one folder without parsing the
+    rest. The manifest is replaced atomically after every folder, so a store
+    interrupted mid-run still lists every folder that was fully written.
+    """
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self._folders = {folder["folder_name"]: folder for folder in manifest["folders"]}
+        self._tables = {}
+        self.frame_dtype = FRAME_DTYPES[manifest["version"]]
+
+    @classmethod
+    def create(cls, path, metadata=None):
+        os.makedirs(path, exist_ok=True)
+        for filename in (FRAMES_FILE, BOXES_FILE):
+            open(os.path.join(path, filename), 'wb').close()
+        store = cls(path, {
+            "version": STORE_VERSION,
+            "metadata": metadata or {},
+            "frame_rows": 0,
+            "box_rows": 0,
+            "folders": [],
+        })
+        store._write_manifest()
+        return store
+
+    @classmethod
+    def open(cls, path):
+        with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("version") not in FRAME_DTYPES:
+            raise ValueError(f"Unsupported prediction store version in {path}")
+        return cls(path, manifest)
+
+    def __contains__(self, folder_name):
+        return folder_name in self._folders
+
+    def folder_names(self):
+        return [folder["folder_name"] for folder in self.manifest["folders"]]
+
+    def append(self, detection_data):
+        """
+        Append one folder's results (the dict returned by process_files_in_folder).
+        Once the manifest lists the folder, it counts as evaluated.
+        """
+        folder_name = detection_data["folder_name"]
+        if folder_name in self._folders:
+            raise ValueError(f"Folder {folder_name} is already in the prediction store")
+        raw_scores = detection_data["raw_scores"]
+        folder_id = len(self.manifest["folders"])
+
+        states, ignition_marks = split_frame_predictions(detection_data["frame_predictions"])
+        frames = np.zeros(len(states), dtype=self.frame_dtype)
+        frames['folder_id'] = folder_id
+        frames['frame_index'] = np.arange(len(states))
+        frames['timestamp'] = raw_scores["frame_times"]
+        frames['state'] = states
+        frames['ignition_mark'] = ignition_marks
+
+        box_rows = [
+            (folder_id, frame_idx, x1, y1, x2, y2, conf, np.nan if score is None else score)
+            for frame_idx, boxes in enumerate(raw_scores["boxes"])
+            for x1, y1, x2, y2, conf, score in boxes
+        ]
+        boxes = np.array(box_rows, dtype=BOX_DTYPE)
+
+        # Tables are written before the manifest points at the new rows
+        self._append_rows(FRAMES_FILE, frames, self.manifest["frame_rows"])
+        self._append_rows(BOXES_FILE, boxes, self.manifest["box_rows"])
+
+        folder = {
+            "folder_name": folder_name,
+            "folder_id": folder_id,
+            "frame_offset": self.manifest["frame_rows"],
+            "frame_count": len(frames),
+            "box_offset": self.manifest["box_rows"],
+            "box_count": len(boxes),
+            "ignition_time": raw_scores["ignition_time"],
+            "yolo_conf": raw_scores["yolo_conf"],
+            "has_classifier": raw_scores["has_classifier"],
+        }
+        folder.update({key: detection_data.get(key) for key in SUMMARY_KEYS})
+        self.manifest["frame_rows"] += len(frames)
+        self.manifest["box_rows"] += len(boxes)
+        self.manifest["folders"].append(folder)
+        self._folders[folder_name] = folder
+        self._tables.clear()
+        self._write_manifest()
+
+    def summary(self, folder_name):
+        return self._folders[folder_name]
+
+    def detection_summaries(self):
+        """
+        Return one detection_data-like dict (counts, delay, timings) per stored
+        folder, in the order the folders were appended.
+        """
+        return [
+            {"folder_name": folder["folder_name"], **{key: folder.get(key) for key in SUMMARY_KEYS}}
+            for folder in self.manifest["folders"]
+        ]
+
+    def frames(self, folder_name):
+        folder = self._folders[folder_name]
+        table = self._table(FRAMES_FILE, self.frame_dtype, self.manifest["frame_rows"])
+        return table[folder["frame_offset"]:folder["frame_offset"] + folder["frame_count"]]
+
+    def boxes(self, folder_name):
+        folder = self._folders[folder_name]
+        table = self._table(BOXES_FILE, BOX_DTYPE, self.manifest["box_rows"])
+        return table[folder["box_offset"]:folder["box_offset"] + folder["box_count"]]
+
+    def frame_predictions(self, folder_name):
+        """
+        Rebuild the folder's frame_predictions list, with its 0 ignition marker.
+        """
+        frames = self.frames(folder_name)
+        predictions = frames['state'].astype(int).tolist()
+        marks = np.flatnonzero(frames['ignition_mark'])
+        if len(marks):
+            predictions.insert(int(marks[0]), 0)
+        return predictions
+
+    def _table(self, filename, dtype, rows):
+        if filename not in self._tables:
+            if rows == 0:
+                self._tables[filename] = np.zeros(0, dtype=dtype)
+            else:
+                # Only the rows listed in the manifest; a partial trailing append is ignored
+                self._tables[filename] = np.memmap(os.path.join(self.path, filename), dtype=dtype, mode='r', shape=(rows,))
+        return self._tables[filename]
+
+    def _append_rows(self, filename, rows, committed_rows):
+        with open(os.path.join(self.path, filename), 'r+b') as f:
+            # Drop rows left behind by an append the manifest never recorded
+            f.truncate(committed_rows * rows.dtype.itemsize)
+            f.seek(0, os.SEEK_END)
+            f.write(rows.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_manifest(self):
+        manifest_path = os.path.join(self.path, MANIFEST_FILE)
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=4)
+        os.replace(tmp_path, manifest_path)
+
+def split_frame_predictions(frame_predictions):
+    """
+    Split frame_predictions into one +1/-1 state per frame and a per-frame
+    flag marking where its 0 ignition marker sits.
+    """
+    marker = frame_predictions.index(0) if 0 in frame_predictions else None
+    states = [prediction for i, prediction in enumerate(frame_predictions) if i != marker]
+    ignition_marks = [0] * len(states)
+    if marker is not None and marker < len(states):
+        ignition_marks[marker] = 1
+    return states, ignition_marks
@@ -0,0 +1,92 @@
+import logging
+from collections import deque
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+def timed(load):
+    start = perf_counter()
+    frame = load()
+    return frame, perf_counter() - start
+
+class Prefetcher:
+    """
+    Wraps a frame source and reads/decodes up to `depth` upcoming frames in
+    background threads while the current frame is in inference. Frames are
+    still yielded in source order.
+
+    Sources with frame_loaders() (JPEG folders) are decoded by `workers`
+    threads in parallel; other sources (video files) are read ahead by a
+    single thread, since their frames must be decoded in sequence.
+    """
+
+    def __init__(self, source, depth=4, workers=2):
+        self.source = source
+        self.name = source.name
+        self.depth = depth
+        self.workers = workers if hasattr(source, 'frame_loaders') else 1
+        self.frames = 0
+        self.decode_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.ready_total = 0
+        self.ready_max = 0
+        self.elapsed_seconds = 0.0
+
+    def __len__(self):
+        return len(self.source)
+
+    def _loaders(self):
+        if hasattr(self.source, 'frame_loaders'):
+            yield from self.source.frame_loaders()
+            return
+        iterator = iter(self.source)
+        while True:
+            yield lambda: next(iterator, None)
+
+    def __iter__(self):
+        start = perf_counter()
+        loaders = self._loaders()
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='prefetch')
+        try:
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < self.depth:
+                    load = next(loaders, None)
+                    if load is None:
+                        exhausted = True
+                        break
+                    pending.append(executor.submit(timed, load))
+                if not pending:
+                    break
+
+                # Frames already decoded when the consumer asks for the next one
+                ready = sum(1 for future in pending if future.done())
+                self.ready_total += ready
+                self.ready_max = max(self.ready_max, ready)
+
+                wait_start = perf_counter()
+                frame, decode_seconds = pending.popleft().result()
+                self.wait_seconds += perf_counter() - wait_start
+                if frame is None:
+                    break
+                self.frames += 1
+                self.decode_seconds += decode_seconds
+                yield frame
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.elapsed_seconds += perf_counter() - start
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "workers": self.workers,
+            "frames": self.frames,
+            "decode_seconds": self.decode_seconds,
+            # Time the inference loop spent blocked on a frame that was not decoded yet
+            "wait_seconds": self.wait_seconds,
+            "mean_ready": self.ready_total / self.frames if self.frames else 0.0,
+            "max_ready": self.ready_max,
+            "frames_per_second": self.frames / self.elapsed_seconds if self.elapsed_seconds > 0 else None,
+        }
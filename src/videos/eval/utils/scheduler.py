@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+from .file_processor import verify_sequences
+from .frame_source import detector_input
+from .timing import StageTimer
+
+logger = logging.getLogger(__name__)
+
+class Batcher:
+    """
+    Collects requests submitted from coroutines and runs them through
+    run_batch(items) -> results as one call, as soon as max_batch_size items
+    are waiting or max_delay seconds after the first one arrived.
+
+    Batches run on the scheduler's model thread so the event loop keeps
+    collecting the next batch meanwhile.
+    """
+
+    def __init__(self, run_batch, executor, max_batch_size, max_delay):
+        self.run_batch = run_batch
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.items = []
+        self.futures = []
+        self.batches = 0
+        self.batched_items = 0
+        self._deadline = None
+        self._running = set()
+
+    def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.items.append(item)
+        self.futures.append(future)
+        if len(self.items) >= self.max_batch_size:
+            self.flush()
+        elif self._deadline is None:
+            self._deadline = loop.call_later(self.max_delay, self.flush)
+        return future
+
+    def flush(self):
+        if self._deadline is not None:
+            self._deadline.cancel()
+            self._deadline = None
+        if not self.items:
+            return
+        items, futures = self.items, self.futures
+        self.items, self.futures = [], []
+        self.batches += 1
+        self.batched_items += len(items)
+        task = asyncio.get_running_loop().create_task(self._run(items, futures))
+        # Keep a reference until the batch is done
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, items, futures):
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, self.run_batch, items)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+    def mean_batch_size(self):
+        return self.batched_items / self.batches if self.batches else 0.0
+
+class InferenceScheduler:
+    """
+    Shares the YOLO detector and the temporal verifier between concurrent
+    camera streams. Each stream keeps its own SequenceDetector (look-back
+    frames, feature cache); their detector and verifier requests are batched
+    across cameras, waiting at most max_delay seconds for a batch to fill.
+    """
+
+    def __init__(self, yolo_model, lstm_resnet_model, yolo_conf, max_batch_size=8, max_delay=0.05, timer=None):
+        self.yolo_model = yolo_model
+        self.lstm_resnet_model = lstm_resnet_model
+        self.yolo_conf = yolo_conf
+        self.timer = timer or StageTimer()
+        # One model thread: batches run one at a time, in submission order
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inference')
+        self.detect_batcher = Batcher(self._detect_batch, self.executor, max_batch_size, max_delay)
+        self.verify_batcher = Batcher(self._verify_batch, self.executor, max_batch_size, max_delay)
+
+    def _detect_batch(self, images):
+        with self.timer.stage('yolo'):
+            return self.yolo_model(images, verbose=False, conf=self.yolo_conf)
+
+    def _verify_batch(self, requests):
+        return verify_sequences(self.lstm_resnet_model, requests, self.timer)
+
+    async def detect(self, image):
+        return await self.detect_batcher.submit(detector_input(image))
+
+    async def update(self, detector, frame_idx, image):
+        """
+        Run one frame of a camera through the detector and verifier batches and
+        return its confirmed boxes, like SequenceDetector.update.
+        """
+        result = await self.detect(image)
+        boxes, confidences = detector.observe(frame_idx, image, result)
+        scores = [None] * len(boxes)
+        if self.lstm_resnet_model is not None:
+            candidate_indices, candidate_expanded_boxes = detector.verification_candidates(image, boxes)
+            predictions = []
+            if candidate_indices:
+                predictions = await self.verify_batcher.submit((detector, candidate_expanded_boxes))
+            scores = detector.assign_scores(frame_idx, len(boxes), candidate_indices, predictions)
+        return detector.decide(boxes, confidences, scores)
+
+    async def run_stream(self, detector, frames, first_frame_idx=0, on_frame=None):
+        """
+        Feed one camera's (name, timestamp, image) frames through the scheduler
+        in order, calling on_frame(name, timestamp, image, positive_boxes, latency)
+        for each. Frames are decoded on the default thread pool. Returns the
+        index for the camera's next frame.
+        """
+        loop = asyncio.get_running_loop()
+        frames = iter(frames)
+        frame_idx = first_frame_idx
+        while True:
+            start = perf_counter()
+            frame = await loop.run_in_executor(None, next, frames, None)
+            if frame is None:
+                return frame_idx
+            name, timestamp, image = frame
+            self.timer.add('decode', perf_counter() - start)
+            positive_boxes = await self.update(detector, frame_idx, image)
+            frame_idx += 1
+            latency = perf_counter() - start
+            self.timer.add('frame', latency)
+            if on_frame is not None:
+                on_frame(name, timestamp, image, positive_boxes, latency)
+
+    def log_stats(self):
+        logger.info(
+            f"Scheduler batches: detector {self.detect_batcher.batches} "
+            f"(mean size {self.detect_batcher.mean_batch_size():.2f}), "
+            f"verifier {self.verify_batcher.batches} (mean size {self.verify_batcher.mean_batch_size():.2f})"
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,92 @@
+import time
+from contextlib import contextmanager
+
+# Upper edges (seconds) of the latency histogram buckets, the last bucket is open ended
+BUCKET_EDGES = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0]
+
+class StageTimer:
+    """
+    Per-stage counters and latency histograms for the evaluation pipeline.
+
+    Histograms use fixed buckets so timers from several folders (or worker
+    processes) can be merged; percentiles are reported as bucket upper edges.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        stats = self.stages.setdefault(name, {
+            "count": 0,
+            "total_seconds": 0.0,
+            "max_seconds": 0.0,
+            "buckets": [0] * (len(BUCKET_EDGES) + 1),
+        })
+        stats["count"] += 1
+        stats["total_seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        stats["buckets"][bucket_index(seconds)] += 1
+
+    def merge(self, other):
+        for name, other_stats in other.stages.items():
+            stats = self.stages.setdefault(name, {
+                "count": 0,
+                "total_seconds": 0.0,
+                "max_seconds": 0.0,
+                "buckets": [0] * (len(BUCKET_EDGES) + 1),
+            })
+            stats["count"] += other_stats["count"]
+            stats["total_seconds"] += other_stats["total_seconds"]
+            stats["max_seconds"] = max(stats["max_seconds"], other_stats["max_seconds"])
+            stats["buckets"] = [a + b for a, b in zip(stats["buckets"], other_stats["buckets"])]
+
+    def to_dict(self):
+        summary = {}
+        for name, stats in self.stages.items():
+            count = stats["count"]
+            summary[name] = {
+                "count": count,
+                "total_seconds": stats["total_seconds"],
+                "mean_seconds": stats["total_seconds"] / count if count else 0.0,
+                "max_seconds": stats["max_seconds"],
+                "p50_seconds": bucket_percentile(stats["buckets"], 0.50),
+                "p95_seconds": bucket_percentile(stats["buckets"], 0.95),
+                "buckets": stats["buckets"],
+            }
+        return summary
+
+    @classmethod
+    def from_dict(cls, summary):
+        timer = cls()
+        for name, stats in summary.items():
+            timer.stages[name] = {
+                "count": stats["count"],
+                "total_seconds": stats["total_seconds"],
+                "max_seconds": stats["max_seconds"],
+                "buckets": list(stats["buckets"]),
+            }
+        return timer
+
+def bucket_index(seconds):
+    for i, edge in enumerate(BUCKET_EDGES):
+        if seconds <= edge:
+            return i
+    return len(BUCKET_EDGES)
+
+def bucket_percentile(buckets, q):
+    total = sum(buckets)
+    if total == 0:
+        return None
+    seen = 0
+    for i, count in enumerate(buckets):
+        seen += count
+        if seen >= q * total:
+            return BUCKET_EDGES[i] if i < len(BUCKET_EDGES) else float('inf')
@@ -0,0 +1,102 @@
+def box_iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    intersection = max(0, x2 - x1) * max(0, y2 - y1)
+    union = box_area(a) + box_area(b) - intersection
+    return intersection / union if union > 0 else 0.0
+
+def box_area(box):
+    return max(0, box[2] - box[0]) * max(0, box[3] - box[1])
+
+def centroid_shift(a, b):
+    """
+    Distance between the box centres, relative to the diagonal of box a.
+    """
+    dx = (a[0] + a[2] - b[0] - b[2]) / 2
+    dy = (a[1] + a[3] - b[1] - b[3]) / 2
+    diagonal = ((a[2] - a[0]) ** 2 + (a[3] - a[1]) ** 2) ** 0.5
+    return (dx * dx + dy * dy) ** 0.5 / diagonal if diagonal > 0 else float('inf')
+
+class Track:
+    def __init__(self, box):
+        self.box = box
+        self.verified_box = None
+        self.score = None
+        self.frames_since_verify = 0
+        self.missed = 0
+
+class BoxTracker:
+    """
+    Greedy IoU tracker over one camera's candidate boxes that lets a box reuse
+    the classifier score of its track.
+
+    A score is reused while the track was verified less than `reverify_every`
+    frames ago, and the box's centre has moved at most `max_drift` (relative
+    to the verified box diagonal) and its area changed by at most `max_growth`
+    (relative) since that verification. Tracks unseen for more than
+    `max_missed` frames are dropped.
+    """
+
+    def __init__(self, reverify_every, iou_threshold=0.5, max_drift=0.1, max_growth=0.2, max_missed=1):
+        self.reverify_every = reverify_every
+        self.iou_threshold = iou_threshold
+        self.max_drift = max_drift
+        self.max_growth = max_growth
+        self.max_missed = max_missed
+        self.tracks = []
+        self.reused = 0
+        self.verified = 0
+
+    def match(self, boxes):
+        """
+        Assign every box to a track, creating tracks for unmatched boxes, and
+        return the tracks in box order.
+        """
+        pairs = sorted(
+            ((box_iou(track.box, box), t, b) for t, track in enumerate(self.tracks) for b, box in enumerate(boxes)),
+            reverse=True
+        )
+        matched = [None] * len(boxes)
+        used_tracks = set()
+        for iou, t, b in pairs:
+            if iou < self.iou_threshold:
+                break
+            if matched[b] is not None or t in used_tracks:
+                continue
+            matched[b] = self.tracks[t]
+            used_tracks.add(t)
+
+        kept = []
+        for t, track in enumerate(self.tracks):
+            if t in used_tracks:
+                track.missed = 0
+                track.frames_since_verify += 1
+                kept.append(track)
+            else:
+                track.missed += 1
+                if track.missed <= self.max_missed:
+                    kept.append(track)
+        for b, box in enumerate(boxes):
+            if matched[b] is None:
+                matched[b] = Track(box)
+                kept.append(matched[b])
+            matched[b].box = box
+        self.tracks = kept
+        return matched
+
+    def reusable(self, track):
+        if track.score is None or track.frames_since_verify >= self.reverify_every:
+            return False
+        if centroid_shift(track.verified_box, track.box) > self.max_drift:
+            return False
+        verified_area = box_area(track.verified_box)
+        return verified_area > 0 and abs(box_area(track.box) / verified_area - 1) <= self.max_growth
+
+    def record(self, track, score):
+        track.score = score
+        track.verified_box = track.box
+        track.frames_since_verify = 0
+
+    def reuse_rate(self):
+        total = self.reused + self.verified
+        return self.reused / total if total else 0.0